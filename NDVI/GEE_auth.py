@@ -5,10 +5,20 @@
 # pip install pandas numpy matplotlib
 
 import ee
+import os
+import threading
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
+GEE_PROJECT = "agriaid-461007"
+# High-volume endpoint: higher concurrency for batch/parallel requests
+GEE_HIGH_VOLUME_URL = "https://earthengine-highvolume.googleapis.com"
+
+_init_lock = threading.Lock()
+# (pid, high_volume) of the last successful ee.Initialize; forked workers get their own session
+_initialized_for = None
+
 # Step 2: Authenticate and initialize Earth Engine
 # First time setup - run this once to authenticate
 def authenticate_gee():
@@ -24,18 +34,34 @@ def authenticate_gee():
         print("Please visit https://earthengine.google.com/ to sign up for access")
 
 # Initialize Earth Engine (run this every time you start your script)
-def initialize_gee():
+def initialize_gee(high_volume: bool = False):
     """
     Initialize Google Earth Engine
+    Safe to call from every request handler: initializes once per process (and endpoint).
+
+    Parameters:
+    high_volume: Use the high-volume endpoint (for batch jobs and parallel requests)
     """
-    try:
-        ee.Initialize(project="agriaid-461007")
-        print("Google Earth Engine initialized successfully!")
+    global _initialized_for
+    state = (os.getpid(), high_volume)
+    if _initialized_for == state:
         return True
-    except Exception as e:
-        print(f"Initialization failed: {e}")
-        print("Make sure you've authenticated first using authenticate_gee()")
-        return False
+    
+    with _init_lock:
+        if _initialized_for == state:
+            return True
+        try:
+            if high_volume:
+                ee.Initialize(project=GEE_PROJECT, opt_url=GEE_HIGH_VOLUME_URL)
+            else:
+                ee.Initialize(project=GEE_PROJECT)
+            _initialized_for = state
+            print("Google Earth Engine initialized successfully!")
+            return True
+        except Exception as e:
+            print(f"Initialization failed: {e}")
+            print("Make sure you've authenticated first using authenticate_gee()")
+            return False
 
 # Example usage:
 if __name__ == "__main__":
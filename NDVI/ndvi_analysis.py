@@ -1,123 +1,293 @@
 import ee
+import multiprocessing
 from .GEE_auth import initialize_gee
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional
 from langchain_core.tools import tool
 from .ndvi_utils import create_farm_boundary
 
 
-def collect_ndvi_data(farm_geometry, start_date, end_date, satellite='LANDSAT8'):
+# QA bits flagging unusable pixels
+LANDSAT_CLOUD_BIT = 1 << 3  # Cloud bit
+LANDSAT_SHADOW_BIT = 1 << 4  # Cloud shadow bit
+SENTINEL2_CLOUD_BIT = 1 << 10  # Cloud bit
+SENTINEL2_CIRRUS_BIT = 1 << 11  # Cirrus bit
+
+# Satellite collections, NDVI bands (NIR, Red), QA band and surface reflectance scaling
+SATELLITE_CONFIG = {
+    'LANDSAT8': {
+        'collection': 'LANDSAT/LC08/C02/T1_L2',
+        'ndvi_bands': ['SR_B5', 'SR_B4'],
+        'cloud_mask': 'QA_PIXEL',
+        'cloud_bits': LANDSAT_CLOUD_BIT | LANDSAT_SHADOW_BIT,
+        'scale_factor': 0.0000275,
+        'offset': -0.2,
+        'scale': 30  # Native resolution in meters
+    },
+    'LANDSAT9': {
+        'collection': 'LANDSAT/LC09/C02/T1_L2',
+        'ndvi_bands': ['SR_B5', 'SR_B4'],
+        'cloud_mask': 'QA_PIXEL',
+        'cloud_bits': LANDSAT_CLOUD_BIT | LANDSAT_SHADOW_BIT,
+        'scale_factor': 0.0000275,
+        'offset': -0.2,
+        'scale': 30  # Native resolution in meters
+    },
+    'SENTINEL2': {
+        'collection': 'COPERNICUS/S2_SR',
+        'ndvi_bands': ['B8', 'B4'],
+        'cloud_mask': 'QA60',
+        'cloud_bits': SENTINEL2_CLOUD_BIT | SENTINEL2_CIRRUS_BIT,
+        'scale_factor': 0.0001,
+        'offset': 0,
+        'scale': 10  # Native resolution in meters
+    }
+}
+
+# Columnar layout for NDVI observations (one record per image date)
+NDVI_DTYPE = np.dtype([
+    ('date', 'M8[D]'),
+    ('ndvi_mean', 'f8'),
+    ('ndvi_stddev', 'f8'),
+    ('ndvi_min', 'f8'),
+    ('ndvi_max', 'f8')
+])
+
+NDVI_FIELDS = list(NDVI_DTYPE.names)
+
+NDVI_POOL_SIZE = 25  # Parallel per-image requests against the high-volume endpoint
+NDVI_SINGLE_REQUEST_MAX_IMAGES = 8  # Up to this many images are fetched in one aggregate_array request
+
+
+def _calculate_ndvi(image, satellite):
+    """
+    Calculate NDVI for a single image
+    
+    Reflectance scaling is linear (scale_factor * DN + offset), so it cancels in the
+    numerator and only shifts the denominator:
+    NDVI = (nir - red) / (nir + red + 2 * offset / scale_factor) on raw DNs.
+    One expression node instead of separate multiply/add/subtract/divide band ops.
+    """
+    config = SATELLITE_CONFIG[satellite]
+    nir_band, red_band = config['ndvi_bands']
+    ndvi = image.expression(
+        'float(nir - red) / (nir + red + k)',
+        {
+            'nir': image.select(nir_band),
+            'red': image.select(red_band),
+            'k': 2 * config['offset'] / config['scale_factor']
+        }
+    ).rename('NDVI')
+    return image.addBands(ndvi)
+
+
+def _cloud_free_mask(qa, satellite):
+    """Build the clear-pixel mask (1 = clear) from the QA band alone"""
+    # One bitwiseAnd against the combined bits instead of one per flag
+    return qa.bitwiseAnd(SATELLITE_CONFIG[satellite]['cloud_bits']).eq(0)
+
+
+def cpu_cloud_mask(qa: np.ndarray, satellite: str) -> np.ndarray:
+    """
+    Clear-pixel mask for QA band pixels pulled client-side
+    (e.g. via sampleRectangle or getDownloadURL)
+    
+    Parameters:
+    qa: Integer array of QA_PIXEL (Landsat) or QA60 (Sentinel-2) values
+    satellite: 'LANDSAT8', 'LANDSAT9', or 'SENTINEL2'
+    
+    Returns:
+    Boolean array, True where the pixel is clear
+    """
+    return (qa & SATELLITE_CONFIG[satellite]['cloud_bits']) == 0
+
+
+def _mask_clouds(image, satellite):
+    """Remove cloudy pixels"""
+    qa = image.select(SATELLITE_CONFIG[satellite]['cloud_mask'])
+    return image.updateMask(_cloud_free_mask(qa, satellite))
+
+
+def _build_collection(farm_geometry, start_date, end_date, satellite, scale):
+    """
+    Filter the satellite collection for the farm and date range.
+    
+    Cloud cover is evaluated on the QA band only, so images with no clear
+    pixels over the farm are dropped before any NIR/Red band is loaded.
+    
+    Returns:
+    Tuple of (filtered ee.ImageCollection, list of image 'system:index' IDs)
+    """
+    cloud_band = SATELLITE_CONFIG[satellite]['cloud_mask']
+    collection = ee.ImageCollection(SATELLITE_CONFIG[satellite]['collection'])
+    filtered_collection = (collection
+                          .filterDate(start_date, end_date)
+                          .filterBounds(farm_geometry))
+    
+    def set_valid_fraction(qa_image):
+        """Fraction of clear pixels over the farm"""
+        clear = _cloud_free_mask(qa_image, satellite).rename('clear')
+        valid_frac = clear.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=farm_geometry,
+            scale=scale,
+            maxPixels=1e9
+        ).get('clear')
+        return qa_image.set('valid_frac', valid_frac)
+    
+    clear_images = (filtered_collection
+                    .select([cloud_band])
+                    .map(set_valid_fraction)
+                    .filter(ee.Filter.gt('valid_frac', 0)))
+    
+    image_ids = clear_images.aggregate_array('system:index').getInfo()
+    return filtered_collection.filter(ee.Filter.inList('system:index', image_ids)), image_ids
+
+
+def _init_worker():
+    """Pool initializer: each worker needs its own Earth Engine session"""
+    initialize_gee(high_volume=True)
+
+
+@lru_cache(maxsize=1)
+def _ndvi_reducer():
+    """
+    Shared-input mean/stdDev/minMax reducer, built once per process.
+    (ee.Reducer is only available after ee.Initialize, so it can't be a module constant)
+    """
+    return ee.Reducer.mean().combine(
+        reducer2=ee.Reducer.stdDev(),
+        sharedInputs=True
+    ).combine(
+        reducer2=ee.Reducer.minMax(),
+        sharedInputs=True
+    )
+
+
+def _ndvi_stats(image, farm_geometry, satellite, scale, tile_scale):
+    """Server-side NDVI statistics (ee.Dictionary keyed by NDVI_FIELDS) for one raw image"""
+    image = _calculate_ndvi(_mask_clouds(image, satellite), satellite)
+    
+    stats = image.select('NDVI').reduceRegion(
+        reducer=_ndvi_reducer(),
+        geometry=farm_geometry,
+        scale=scale,
+        maxPixels=1e13,
+        tileScale=tile_scale,  # Smaller tiles: less memory per tile, more backend parallelism
+        bestEffort=True
+    )
+    
+    return ee.Dictionary({
+        'date': image.date().format('YYYY-MM-dd'),
+        'ndvi_mean': stats.get('NDVI_mean'),
+        'ndvi_stddev': stats.get('NDVI_stdDev'),
+        'ndvi_min': stats.get('NDVI_min'),
+        'ndvi_max': stats.get('NDVI_max')
+    })
+
+
+def _fetch_one(image_id, geometry_json, satellite, scale, tile_scale=4):
+    """
+    Get NDVI statistics for a single image over the farm area
+    
+    Parameters:
+    image_id: The image 'system:index' within the satellite collection
+    geometry_json: Serialized farm geometry (ee objects don't pickle across processes)
+    satellite: Key into SATELLITE_CONFIG
+    scale: Reduction resolution in meters
+    tile_scale: reduceRegion tileScale (higher splits the reduction into more, smaller tiles)
+    
+    Returns:
+    Dictionary of NDVI statistics for the image date
+    """
+    farm_geometry = ee.deserializer.fromJSON(geometry_json)
+    image = ee.Image(f"{SATELLITE_CONFIG[satellite]['collection']}/{image_id}")
+    return _ndvi_stats(image, farm_geometry, satellite, scale, tile_scale).getInfo()
+
+
+def _fetch_columns(collection, farm_geometry, satellite, scale, tile_scale=4):
+    """
+    Get NDVI statistics for a whole (small) collection in a single request
+    
+    Each image becomes one row list (in NDVI_FIELDS order) instead of a GeoJSON Feature,
+    so only the values themselves cross the wire. Only images without an NDVI mean are
+    dropped; missing stddev/min/max stay None and are filled by collect_ndvi_data exactly
+    as for the per-image path.
+    
+    Returns:
+    List of dictionaries of NDVI statistics, one per image with an NDVI mean
+    """
+    def to_row(image):
+        stats = _ndvi_stats(image, farm_geometry, satellite, scale, tile_scale)
+        return ee.Feature(None, stats).set('row', stats.values(NDVI_FIELDS))
+    
+    rows = (collection
+            .map(to_row)
+            .filter(ee.Filter.notNull(['ndvi_mean']))
+            .aggregate_array('row')
+            .getInfo())
+    return [dict(zip(NDVI_FIELDS, row)) for row in rows]
+
+
+def collect_ndvi_data(farm_geometry, start_date, end_date, satellite='LANDSAT8', tile_scale=4, scale=None):
     """
     Collect NDVI data for a farm area over a specific time period
     
+    Per-image statistics are fetched in parallel (one small request per image)
+    instead of a single large getInfo over the whole collection. Small collections
+    are fetched in one request as a list of rows.
+    Earth Engine is initialized (once) against the high-volume endpoint if needed.
+    
     Parameters:
     farm_geometry: ee.Geometry object (from create_farm_boundary)
     start_date: Start date as string 'YYYY-MM-DD'
     end_date: End date as string 'YYYY-MM-DD'
     satellite: 'LANDSAT8', 'LANDSAT9', or 'SENTINEL2' (Sentinel-2 has better resolution)
+    tile_scale: reduceRegion tileScale; raise (e.g. 8 or 16) for very large regions
+    scale: Resolution in meters (default: native - 30m Landsat, 10m Sentinel-2); use coarser for multi-year queries
     
     Returns:
-    Dictionary with NDVI statistics and time series data
+    Dictionary with NDVI statistics and time series data ('data' is an NDVI_DTYPE array
+    sorted by date; use ndvi_records() for a JSON-friendly list)
     """
+    if satellite not in SATELLITE_CONFIG:
+        return {'error': f"Unsupported satellite: {satellite}"}
     
-    # Define satellite collections and NDVI calculation
-    if satellite == 'LANDSAT8':
-        collection = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2')
-        ndvi_bands = ['SR_B5', 'SR_B4']  # NIR, Red
-        cloud_mask = 'QA_PIXEL'
-    elif satellite == 'LANDSAT9':
-        collection = ee.ImageCollection('LANDSAT/LC09/C02/T1_L2')
-        ndvi_bands = ['SR_B5', 'SR_B4']  # NIR, Red
-        cloud_mask = 'QA_PIXEL'
-    elif satellite == 'SENTINEL2':
-        collection = ee.ImageCollection('COPERNICUS/S2_SR')
-        ndvi_bands = ['B8', 'B4']  # NIR, Red
-        cloud_mask = 'QA60'
-    
-    def calculate_ndvi(image):
-        """Calculate NDVI for a single image"""
-        if satellite.startswith('LANDSAT'):
-            # Landsat scaling factors
-            nir = image.select(ndvi_bands[0]).multiply(0.0000275).add(-0.2)
-            red = image.select(ndvi_bands[1]).multiply(0.0000275).add(-0.2)
-        else:
-            # Sentinel-2 scaling
-            nir = image.select(ndvi_bands[0]).multiply(0.0001)
-            red = image.select(ndvi_bands[1]).multiply(0.0001)
-        
-        ndvi = nir.subtract(red).divide(nir.add(red)).rename('NDVI')
-        return image.addBands(ndvi)
-    
-    def mask_clouds(image):
-        """Remove cloudy pixels"""
-        if satellite.startswith('LANDSAT'):
-            qa = image.select(cloud_mask)
-            cloud_mask_value = 1 << 3  # Cloud bit
-            shadow_mask_value = 1 << 4  # Cloud shadow bit
-            mask = qa.bitwiseAnd(cloud_mask_value).eq(0).And(
-                   qa.bitwiseAnd(shadow_mask_value).eq(0))
-        else:  # Sentinel-2
-            qa = image.select(cloud_mask)
-            cloud_mask_value = 1 << 10  # Cloud bit
-            cirrus_mask_value = 1 << 11  # Cirrus bit
-            mask = qa.bitwiseAnd(cloud_mask_value).eq(0).And(
-                   qa.bitwiseAnd(cirrus_mask_value).eq(0))
-        
-        return image.updateMask(mask)
+    if not initialize_gee(high_volume=True):
+        return {'error': 'Google Earth Engine initialization failed'}
     
-    # Filter and process the collection
-    filtered_collection = (collection
-                          .filterDate(start_date, end_date)
-                          .filterBounds(farm_geometry)
-                          .map(mask_clouds)
-                          .map(calculate_ndvi))
-    
-    # Get NDVI statistics for each image
-    def get_ndvi_stats(image):
-        """Get NDVI statistics for the farm area"""
-        stats = image.select('NDVI').reduceRegion(
-            reducer=ee.Reducer.mean().combine(
-                reducer2=ee.Reducer.stdDev(),
-                sharedInputs=True
-            ).combine(
-                reducer2=ee.Reducer.minMax(),
-                sharedInputs=True
-            ),
-            geometry=farm_geometry,
-            scale=30,  # 30m resolution for Landsat, 10m for Sentinel-2
-            maxPixels=1e9
+    if scale is None:
+        scale = SATELLITE_CONFIG[satellite]['scale']
+    
+    collection, image_ids = _build_collection(farm_geometry, start_date, end_date, satellite, scale)
+    
+    results = []
+    if 0 < len(image_ids) <= NDVI_SINGLE_REQUEST_MAX_IMAGES:
+        # A pool isn't worth its startup for a handful of images
+        results = _fetch_columns(collection, farm_geometry, satellite, scale, tile_scale)
+    elif image_ids:
+        geometry_json = farm_geometry.serialize()
+        with multiprocessing.Pool(min(NDVI_POOL_SIZE, len(image_ids)), initializer=_init_worker) as pool:
+            results = pool.starmap(_fetch_one, [(image_id, geometry_json, satellite, scale, tile_scale) for image_id in image_ids])
+    
+    # Process results into a structured array, skipping images with no valid data
+    valid = [props for props in results if props.get('ndvi_mean') is not None]
+    ndvi_data = np.empty(len(valid), dtype=NDVI_DTYPE)
+    for i, props in enumerate(valid):
+        ndvi_data[i] = (
+            props['date'],
+            round(props['ndvi_mean'], 3),
+            round(props['ndvi_stddev'], 3) if props.get('ndvi_stddev') else 0,
+            # A missing min/max (e.g. a single valid pixel under bestEffort) falls back to the mean
+            round(props['ndvi_min'] if props.get('ndvi_min') is not None else props['ndvi_mean'], 3),
+            round(props['ndvi_max'] if props.get('ndvi_max') is not None else props['ndvi_mean'], 3)
         )
-        
-        return ee.Feature(None, {
-            'date': image.date().format('YYYY-MM-dd'),
-            'ndvi_mean': stats.get('NDVI_mean'),
-            'ndvi_stddev': stats.get('NDVI_stdDev'),
-            'ndvi_min': stats.get('NDVI_min'),
-            'ndvi_max': stats.get('NDVI_max')
-        })
-    
-    # Calculate statistics for each image
-    ndvi_time_series = filtered_collection.map(get_ndvi_stats)
-    
-    # Get the results
-    results = ndvi_time_series.getInfo()
-    
-    # Process results into a clean format
-    ndvi_data = []
-    for feature in results['features']:
-        props = feature['properties']
-        if props['ndvi_mean'] is not None:  # Skip images with no valid data
-            ndvi_data.append({
-                'date': props['date'],
-                'ndvi_mean': round(props['ndvi_mean'], 3),
-                'ndvi_stddev': round(props['ndvi_stddev'], 3) if props['ndvi_stddev'] else 0,
-                'ndvi_min': round(props['ndvi_min'], 3),
-                'ndvi_max': round(props['ndvi_max'], 3)
-            })
     
     # Sort by date
-    ndvi_data.sort(key=lambda x: x['date'])
+    ndvi_data.sort(order='date')
     
     return {
         'satellite': satellite,
@@ -126,56 +296,96 @@ def collect_ndvi_data(farm_geometry, start_date, end_date, satellite='LANDSAT8')
         'data': ndvi_data
     }
 
+
+def ndvi_records(ndvi_data: np.ndarray) -> List[Dict]:
+    """Convert an NDVI_DTYPE array to a JSON-friendly list of dicts"""
+    return [
+        {
+            'date': date.isoformat(),
+            'ndvi_mean': ndvi_mean,
+            'ndvi_stddev': ndvi_stddev,
+            'ndvi_min': ndvi_min,
+            'ndvi_max': ndvi_max
+        }
+        for date, ndvi_mean, ndvi_stddev, ndvi_min, ndvi_max in ndvi_data.tolist()
+    ]
+
+
 def analyze_ndvi_trends(ndvi_results: Dict, trend_analysis: str = 'basic') -> Dict:
     """
     Analyze trends in NDVI data.
     
     Parameters:
-    ndvi_results: Results from collect_ndvi_data (must contain 'data' key with list of observations)
+    ndvi_results: Results from collect_ndvi_data (must contain 'data' key with an NDVI_DTYPE array)
     trend_analysis: 'basic', 'detailed', or 'seasonal'
     
     Returns:
     Dictionary with trend analysis results
     """
-    if not ndvi_results.get('data'):
+    data = ndvi_results.get('data')
+    if data is None or len(data) == 0:
         return {'error': 'No NDVI data provided for analysis'}
     
-    data = ndvi_results['data']
-    valid_data = [d for d in data if d['ndvi_mean'] is not None]
-    
-    if len(valid_data) < 2:
+    if len(data) < 2:
         return {'error': 'Insufficient data points for trend analysis'}
     
     # Basic trend analysis
-    means = [d['ndvi_mean'] for d in valid_data]
-    dates = [pd.to_datetime(d['date']) for d in valid_data]
+    means = data['ndvi_mean']
+    dates = np.datetime_as_string(data['date'])
     
-    # Simple linear trend
-    x = list(range(len(means)))
-    trend_slope = (means[-1] - means[0]) / (len(means) - 1) if len(means) > 1 else 0
+    # Least-squares linear trend (NDVI change per observation).
+    # x = 0..n-1 is evenly spaced, so sum((x - x_mean)^2) = n(n^2 - 1)/12 and the
+    # slope is a single dot product - no lstsq solve needed.
+    n = means.size
+    x_centered = np.arange(n, dtype=np.float64) - (n - 1) / 2
+    trend_slope = float(x_centered @ means) / (n * (n * n - 1) / 12)
     
     trend_direction = 'increasing' if trend_slope > 0.01 else 'decreasing' if trend_slope < -0.01 else 'stable'
     
+    imax = int(means.argmax())
+    imin = int(means.argmin())
+    
     analysis = {
         'trend_direction': trend_direction,
         'trend_slope': round(trend_slope, 4),
         'highest_ndvi': {
-            'value': max(means),
-            'date': valid_data[means.index(max(means))]['date']
+            'value': float(means[imax]),
+            'date': str(dates[imax])
         },
         'lowest_ndvi': {
-            'value': min(means),
-            'date': valid_data[means.index(min(means))]['date']
+            'value': float(means[imin]),
+            'date': str(dates[imin])
         },
-        'average_ndvi': round(sum(means) / len(means), 3),
-        'data_points': len(valid_data),
+        'average_ndvi': round(float(means.mean()), 3),
+        'data_points': len(data),
         'date_range': {
-            'start': valid_data[0]['date'],
-            'end': valid_data[-1]['date']
+            'start': str(dates[0]),
+            'end': str(dates[-1])
         }
     }
     
-    return 
+    return analysis
+
+
+def resample_ndvi_data(ndvi_results: Dict, freq: str) -> pd.DataFrame:
+    """
+    Aggregate collected NDVI observations client-side.
+    
+    Lets one wide collect_ndvi_data call serve daily/weekly/monthly views
+    instead of issuing a separate Earth Engine request per range.
+    
+    Parameters:
+    ndvi_results: Results from collect_ndvi_data
+    freq: pandas offset alias, e.g. 'D', 'W' or 'MS'
+    
+    Returns:
+    DataFrame indexed by period with mean NDVI statistics
+    """
+    df = pd.DataFrame(ndvi_results.get('data', []))
+    if df.empty:
+        return df
+    df['date'] = pd.to_datetime(df['date'])
+    return df.set_index('date').resample(freq).mean().dropna(how='all')
 
 
 def ndvi_analysis_for_ai(county: str, subcounty: str, ward: str, 
@@ -196,7 +406,7 @@ def ndvi_analysis_for_ai(county: str, subcounty: str, ward: str,
     """
     from regions.get_region import get_ward_data
 
-    if initialize_gee():
+    if initialize_gee(high_volume=True):
         ward_data = get_ward_data(county, subcounty, ward)
         if not ward_data:
             return {'error': 'Ward data not found'}
@@ -223,7 +433,7 @@ def ndvi_analysis_for_ai(county: str, subcounty: str, ward: str,
                 'ward': ward,
                 'county': county,
                 'subcounty': subcounty,
-                'ndvi_results': ndvi_results,
+                'ndvi_results': {**ndvi_results, 'data': ndvi_records(ndvi_results['data'])},
                 'trend_analysis': trend_analysis
             }
         except Exception as e:
@@ -253,14 +463,17 @@ if __name__ == "__main__":
         #     satellite='LANDSAT8'
         # )
 
+        # Fetch the widest range once, then slice/aggregate client-side
+        # all_data = collect_ndvi_data(farm_area, '2020-01-01', '2023-12-31')
+
         # Short range (daily data)
-        # daily_data = collect_ndvi_data(farm_area, '2023-06-01', '2023-08-31')
+        # daily_data = resample_ndvi_data(all_data, 'D').loc['2023-06-01':'2023-08-31']
 
         # Medium range (weekly composites)
-        # weekly_data = collect_ndvi_data(farm_area, '2022-01-01', '2022-12-31')
+        # weekly_data = resample_ndvi_data(all_data, 'W').loc['2022-01-01':'2022-12-31']
 
         # Long range (monthly composites)
-        # monthly_data = collect_ndvi_data(farm_area, '2020-01-01', '2023-12-31')
+        # monthly_data = resample_ndvi_data(all_data, 'MS')
 
         # Ndvi analysis by ai tool
 
@@ -268,8 +481,5 @@ if __name__ == "__main__":
         # print("Weekly NDVI Data:", weekly_data)
         # print("Monthly NDVI Data:", monthly_data)
         # # Analyze trends
-        # trend_analysis = analyze_ndvi_trends(monthly_data, trend_analysis='basic')
+        # trend_analysis = analyze_ndvi_trends(all_data, trend_analysis='basic')
         # print("Trend Analysis:", trend_analysis)
-        
-        
-        
\ No newline at end of file
@@ -1,11 +1,27 @@
+import threading
 import ee
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
+from cachetools import LRUCache
 from langchain_core.tools import tool
 
+# Farm geometries keyed by (kind, flattened coordinates, buffer_meters); bounded because
+# the keys come from arbitrary user coordinates
+_geom_cache: LRUCache = LRUCache(maxsize=1024)
+_geom_cache_lock = threading.Lock()
 
-def create_farm_boundary(coordinates, buffer_meters=0):
+
+def _boundary_kind(coords: np.ndarray) -> str:
+    """Infer 'point', 'rect' or 'polygon' from the coordinate array shape"""
+    if coords.ndim == 1:
+        return 'point'
+    if coords.shape == (2, 2):
+        return 'rect'
+    return 'polygon'
+
+
+def create_farm_boundary(coordinates, buffer_meters=0, kind: Optional[str] = None):
     """
     Create a farm boundary from coordinates
     
@@ -15,39 +31,54 @@ def create_farm_boundary(coordinates, buffer_meters=0):
         - Multiple points: [[lon1, lat1], [lon2, lat2], ...] - creates polygon
         - Rectangle: [[min_lon, min_lat], [max_lon, max_lat]] - creates bounding box
     buffer_meters: Buffer distance in meters (useful for point coordinates)
+    kind: 'point', 'rect' or 'polygon' to skip shape detection
+          (two-point input is treated as a rectangle unless kind='polygon')
     
     Returns:
-    ee.Geometry object representing the farm boundary
+    ee.Geometry object representing the farm boundary (cached for repeat coordinates)
     """
-    
-    if len(coordinates) == 2 and not isinstance(coordinates[0], list):
+    coords = np.asarray(coordinates, dtype=float)
+    if kind is None:
+        kind = _boundary_kind(coords)
+    
+    key = (kind, tuple(coords.ravel().tolist()), buffer_meters)
+    with _geom_cache_lock:
+        geometry = _geom_cache.get(key)
+    if geometry is None:
+        geometry = _create_farm_boundary(coords, buffer_meters, kind)
+        with _geom_cache_lock:
+            _geom_cache[key] = geometry
+    return geometry
+
+
+def _create_farm_boundary(coords: np.ndarray, buffer_meters, kind: str):
+    """Build the ee.Geometry for create_farm_boundary"""
+    if kind == 'point':
         # Single point coordinates [longitude, latitude]
-        print(f"Creating point boundary at: {coordinates}")
-        point = ee.Geometry.Point(coordinates)
-        if buffer_meters > 0:
-            return point.buffer(buffer_meters)
-        else:
-            return point.buffer(100)  # Default 100m buffer
-    
-    elif len(coordinates) == 2 and isinstance(coordinates[0], list):
+        print(f"Creating point boundary at: {coords.tolist()}")
+        return ee.Geometry.Point(coords.tolist()).buffer(buffer_meters if buffer_meters > 0 else 100)  # Default 100m buffer
+    
+    if kind == 'rect':
         # Rectangle coordinates [[min_lon, min_lat], [max_lon, max_lat]]
-        print(f"Creating rectangle boundary: {coordinates}")
-        min_lon, min_lat = coordinates[0]
-        max_lon, max_lat = coordinates[1]
-        return ee.Geometry.Rectangle([min_lon, min_lat, max_lon, max_lat])
+        print(f"Creating rectangle boundary: {coords.tolist()}")
+        return ee.Geometry.Rectangle(coords.ravel().tolist())
     
-    else:
-        # Multiple points forming a polygon
-        print(f"Creating polygon boundary with {len(coordinates)} points")
-        return ee.Geometry.Polygon([coordinates])
+    # Multiple points forming a polygon
+    print(f"Creating polygon boundary with {len(coords)} points")
+    return ee.Geometry.Polygon([coords.tolist()])
 
 
 def get_farm_info(geometry):
     """
     Get basic information about the farm area
     """
-    area_hectares = geometry.area().divide(10000).getInfo()  # Convert m² to hectares
-    centroid = geometry.centroid().coordinates().getInfo()
+    # Single round trip for both values
+    info = ee.Dictionary({
+        'area_ha': geometry.area().divide(10000),  # Convert m² to hectares
+        'center': geometry.centroid().coordinates()
+    }).getInfo()
+    area_hectares = info['area_ha']
+    centroid = info['center']
     
     print(f"Farm area: {area_hectares:.2f} hectares")
     print(f"Farm center coordinates: {centroid}")
@@ -58,7 +89,13 @@ def get_farm_info(geometry):
     }
 
 
-def determine_processing_strategy(start_date: str, end_date: str, user_intent: str = 'auto') -> Tuple[str, int, int]:
+def _coerce_dates(start_date: Union[str, pd.Timestamp], end_date: Union[str, pd.Timestamp]) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Parse a date pair once at the API boundary, normalized to midnight whatever the input type"""
+    return pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+
+
+def determine_processing_strategy(start_date: Union[str, pd.Timestamp], end_date: Union[str, pd.Timestamp],
+                                  user_intent: str = 'auto') -> Tuple[str, int, int]:
     """
     Determine optimal processing strategy based on date range and user intent
     
@@ -67,7 +104,8 @@ def determine_processing_strategy(start_date: str, end_date: str, user_intent: s
     - scale: resolution in meters
     - max_samples: maximum number of data points
     """
-    days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days
+    start, end = _coerce_dates(start_date, end_date)
+    days = (end - start).days
     
     # User intent override
     intent_mapping = {
@@ -91,102 +129,64 @@ def determine_processing_strategy(start_date: str, end_date: str, user_intent: s
     else:
         return 'yearly', 60, min(10, days // 365)  # Max 10 years, lower resolution
 
-def generate_time_periods(start_date: str, end_date: str, period: str) -> List[Dict]:
+def _build_periods(starts: pd.DatetimeIndex, ends: pd.DatetimeIndex, labels) -> List[Dict]:
+    """Zip vectorized period bounds and labels into period dicts"""
+    return [
+        {'start': period_start, 'end': period_end, 'label': label}
+        for period_start, period_end, label in zip(
+            starts.strftime('%Y-%m-%d'), ends.strftime('%Y-%m-%d'), labels
+        )
+    ]
+
+
+def generate_time_periods(start_date: Union[str, pd.Timestamp], end_date: Union[str, pd.Timestamp],
+                          period: str) -> List[Dict]:
     """
     Generate time periods for aggregation
     """
-    start = pd.to_datetime(start_date)
-    end = pd.to_datetime(end_date)
-    periods = []
+    start, end = _coerce_dates(start_date, end_date)
     
     if period == 'daily':
-        current = start
-        while current <= end:
-            periods.append({
-                'start': current.strftime('%Y-%m-%d'),
-                'end': current.strftime('%Y-%m-%d'),
-                'label': current.strftime('%Y-%m-%d')
-            })
-            current += timedelta(days=1)
+        days = pd.date_range(start, end, freq='D')
+        return _build_periods(days, days, days.strftime('%Y-%m-%d'))
     
     elif period == 'weekly':
-        current = start
-        while current <= end:
-            week_end = min(current + timedelta(days=6), end)
-            periods.append({
-                'start': current.strftime('%Y-%m-%d'),
-                'end': week_end.strftime('%Y-%m-%d'),
-                'label': f"Week of {current.strftime('%Y-%m-%d')}"
-            })
-            current += timedelta(days=7)
+        starts = pd.date_range(start, end, freq='7D')
+        ends = starts + pd.Timedelta(days=6)
+        ends = ends.where(ends <= end, end)
+        return _build_periods(starts, ends, 'Week of ' + starts.strftime('%Y-%m-%d'))
     
     elif period == 'monthly':
-        current = start.replace(day=1)  # Start from first day of month
-        while current <= end:
-            # Get last day of current month
-            if current.month == 12:
-                next_month = current.replace(year=current.year + 1, month=1)
-            else:
-                next_month = current.replace(month=current.month + 1)
-            month_end = min(next_month - timedelta(days=1), end)
-            
-            periods.append({
-                'start': max(current, start).strftime('%Y-%m-%d'),
-                'end': month_end.strftime('%Y-%m-%d'),
-                'label': current.strftime('%Y-%m')
-            })
-            current = next_month
+        months = pd.date_range(start.replace(day=1), end, freq='MS')  # Start from first day of month
+        starts = months.where(months >= start, start)
+        ends = months + pd.offsets.MonthEnd(0)
+        ends = ends.where(ends <= end, end)
+        return _build_periods(starts, ends, months.strftime('%Y-%m'))
     
     elif period == 'seasonal':
         # Define seasons: Spring (Mar-May), Summer (Jun-Aug), Fall (Sep-Nov), Winter (Dec-Feb)
-        seasons = [
-            ('Spring', [3, 4, 5]),
-            ('Summer', [6, 7, 8]),
-            ('Fall', [9, 10, 11]),
-            ('Winter', [12, 1, 2])
-        ]
+        season_names = {3: 'Spring', 6: 'Summer', 9: 'Fall', 12: 'Winter'}
+        
+        season_starts = pd.date_range(pd.Timestamp(start.year, 3, 1), end, freq='QS-DEC')
+        season_ends = season_starts + pd.offsets.QuarterEnd(0, startingMonth=2)
         
-        current_year = start.year
-        end_year = end.year
+        # Keep seasons that overlap with our date range
+        overlapping = season_ends >= start
+        season_starts = season_starts[overlapping]
+        season_ends = season_ends[overlapping]
         
-        for year in range(current_year, end_year + 1):
-            for season_name, months in seasons:
-                season_start = pd.to_datetime(f'{year}-{months[0]:02d}-01')
-                if months[-1] == 2:  # Handle February end
-                    season_end = pd.to_datetime(f'{year + 1 if months[0] == 12 else year}-{months[-1]:02d}-28')
-                else:
-                    next_month = months[-1] + 1 if months[-1] < 12 else 1
-                    next_year = year if months[-1] < 12 else year + 1
-                    season_end = pd.to_datetime(f'{next_year}-{next_month:02d}-01') - timedelta(days=1)
-                
-                # Check if season overlaps with our date range
-                if season_end >= start and season_start <= end:
-                    actual_start = max(season_start, start)
-                    actual_end = min(season_end, end)
-                    
-                    periods.append({
-                        'start': actual_start.strftime('%Y-%m-%d'),
-                        'end': actual_end.strftime('%Y-%m-%d'),
-                        'label': f'{season_name} {year}'
-                    })
+        labels = [f'{season_names[d.month]} {d.year}' for d in season_starts]
+        return _build_periods(
+            season_starts.where(season_starts >= start, start),
+            season_ends.where(season_ends <= end, end),
+            labels
+        )
     
     elif period == 'yearly':
-        current_year = start.year
-        end_year = end.year
-        
-        for year in range(current_year, end_year + 1):
-            year_start = pd.to_datetime(f'{year}-01-01')
-            year_end = pd.to_datetime(f'{year}-12-31')
-            
-            actual_start = max(year_start, start)
-            actual_end = min(year_end, end)
-            
-            periods.append({
-                'start': actual_start.strftime('%Y-%m-%d'),
-                'end': actual_end.strftime('%Y-%m-%d'),
-                'label': str(year)
-            })
-    
-    return periods
-
-
+        years = pd.date_range(pd.Timestamp(start.year, 1, 1), end, freq='YS')
+        starts = years.where(years >= start, start)
+        ends = years + pd.offsets.YearEnd(0)
+        ends = ends.where(ends <= end, end)
+        return _build_periods(starts, ends, years.strftime('%Y'))
+    
+    return []
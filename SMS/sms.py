@@ -1,10 +1,17 @@
 from dotenv import load_dotenv
 import os
+import logging
 import africastalking
-from typing import List
+import africastalking.Service as at_service
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Initialize the SDK
 africastalking.initialize(
     username="sandbox",
@@ -13,22 +20,43 @@ africastalking.initialize(
 
 sms = africastalking.SMS
 
-def send_message(recipients: List = ["+254720705104"], message: str = "Hello from Africa's Talking!"):
+# The SDK calls requests.get/requests.post for every send, opening a new connection each time.
+# Route those calls through a pooled keep-alive session so TLS setup is paid once.
+at_session = requests.Session()
+at_session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=3))
+at_service.requests = at_session
+
+# Set your shortCode or senderId
+AT_SHORT_CODE = os.getenv("AT_SHORT_CODE")
+
+SMS_BULK_WORKERS = 16  # Concurrent sends for distinct messages
+
+def send_message(recipients: List[str], message: str):
     """
     Function to send SMS using Africa's Talking API.
     This can be used to send messages to any recipient(s) using the Africa's Talking SMS service.
+    All recipients of the same message are sent in a single request.
     """
-    # Set your shortCode or senderId
-    sender = os.getenv("AT_SHORT_CODE")
-    
     try:
         response = sms.send(
                 message=message,
-                recipients=recipients,  # replace with your recipient's phone number
-                sender_id=sender # your Alphanumeric sender ID
+                recipients=recipients,
+                sender_id=AT_SHORT_CODE # your Alphanumeric sender ID
             )
 
-        print(response)
+        logger.debug("SMS send response: %s", response)
         return response
     except Exception as e:
-        raise f"Error sending SMS: {e}" from e
+        raise RuntimeError(f"Error sending SMS: {e}") from e
+
+def send_bulk(pairs: List[Tuple[List[str], str]]) -> List:
+    """
+    Send several (recipients, message) pairs.
+    Recipients sharing a message are grouped into one request and distinct messages are sent concurrently.
+    """
+    grouped: Dict[str, List[str]] = {}
+    for recipients, message in pairs:
+        grouped.setdefault(message, []).extend(recipients)
+
+    with ThreadPoolExecutor(max_workers=SMS_BULK_WORKERS) as executor:
+        return list(executor.map(lambda item: send_message(item[1], item[0]), grouped.items()))
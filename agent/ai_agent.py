@@ -1,19 +1,22 @@
-from typing import Annotated, Sequence, TypedDict, Optional, Dict, Any, List
-from datetime import datetime, timedelta
+from typing import Annotated, Sequence, TypedDict, Optional, Dict, Any, List, Tuple
+from datetime import datetime
 from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
-from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
 from dotenv import load_dotenv
 import redis
+from redis import asyncio as aioredis
 import pymongo
-import json
+import orjson
+import time
 import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 import asyncio
 
+# Load .env before the tool modules, which read their settings (e.g. KENYA_WARDS_FILE) at import
+load_dotenv()
+
 from agri_centers.agri_center_operations import register_agro_center, get_centers_by_location, get_user_centers, update_agro_center, delete_agro_center, rate_agro_center, get_top_rated_centers
 from farmers.farmer_operations import register_farmer_location, get_farmer_locations, delete_farmer_location, get_farmers_in_location, get_farmer_recommended_centers, is_farmer_registered_in_ward
 from NDVI.ndvi_analysis import ndvi_analysis_for_ai
@@ -25,8 +28,6 @@ from models.models import SessionConfig
 from SMS.sms import send_message
 
 
-load_dotenv()
-
 # State and Session Management
 class AgentState(TypedDict):
     """Agent state for LangGraph"""
@@ -37,32 +38,71 @@ class AgentState(TypedDict):
     session_start: datetime
 
 class SessionData(TypedDict):
-    """Session data structure for storage"""
+    """Session metadata for storage (messages are kept in a separate Redis list)"""
     session_id: str
     user_phone: str
-    messages: List[Dict[str, Any]]
     message_count: int
-    session_start: str
-    last_activity: str
+    session_start_ts: int  # Unix epoch seconds
+    last_activity_ts: int  # Unix epoch seconds
     is_active: bool
 
-tools = [tool(register_agro_center), tool(get_centers_by_location), tool(get_user_centers),
+# Tool registry: wrapped once at import and shared by bind_tools and the ToolNode
+# (which keeps its own name -> tool dict for dispatch)
+tools = (tool(register_agro_center), tool(get_centers_by_location), tool(get_user_centers),
          tool(update_agro_center), tool(delete_agro_center), tool(rate_agro_center), tool(get_top_rated_centers),
          tool(register_farmer_location), tool(get_farmer_locations), tool(delete_farmer_location),
          tool(get_farmers_in_location), tool(get_farmer_recommended_centers), tool(is_farmer_registered_in_ward),
          tool(ndvi_analysis_for_ai), tool(get_counties), tool(get_subcounties), tool(get_wards), tool(get_ward_data),
          tool(get_weather_for_farmer), tool(get_soil_data_for_ai_agent),
          tool(register_user), tool(get_user_by_phone_number), tool(update_user_name), tool(delete_user),
-         tool(send_message)]
+         tool(send_message))
+
+# Database connections (created once, shared by every message)
+redis_pool = redis.ConnectionPool(host='localhost', port=6379, db=0, decode_responses=True, max_connections=32)
+# Used by the async entry points; connections are bound to the event loop that first uses them
+async_redis_pool = aioredis.ConnectionPool(host='localhost', port=6379, db=0, decode_responses=True, max_connections=32)
+mongo_client = pymongo.MongoClient('mongodb://localhost:27017/', maxPoolSize=32)
 
-# Database connections
 def get_redis_client() -> redis.Redis:
-    """Initialize Redis client"""
-    return redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+    """Get a Redis client backed by the shared connection pool"""
+    return redis.Redis(connection_pool=redis_pool)
+
+def get_async_redis_client() -> aioredis.Redis:
+    """Get an asyncio Redis client backed by the shared async connection pool"""
+    return aioredis.Redis(connection_pool=async_redis_pool)
+
+# Everything needed to handle an incoming message in one round trip:
+# today's session count, the active session ID, its metadata and recent messages.
+# KEYS are the active-session pointer, the daily counter and the session's meta/messages
+# keys for ARGV[1], the session ID the caller read from the pointer. Every key the script
+# touches is declared up front; if the pointer has moved since, the script returns
+# {0, <current session ID>} and the caller retries with that session's keys.
+# Run via EVALSHA (redis-py loads the script on first use).
+LOAD_TURN_STATE_SCRIPT = """
+local session_id = redis.call('GET', KEYS[1]) or ''
+if session_id ~= ARGV[1] then
+    return {0, session_id}
+end
+local sessions_today = redis.call('GET', KEYS[2]) or ''
+if session_id == '' then
+    return {1, sessions_today, '', {}, {}}
+end
+return {
+    1,
+    sessions_today,
+    session_id,
+    redis.call('HGETALL', KEYS[3]),
+    redis.call('LRANGE', KEYS[4], tonumber(ARGV[2]), -1)
+}
+"""
+# Attempts before giving up when the active session keeps changing under the script
+TURN_STATE_MAX_ATTEMPTS = 3
+load_turn_state_script = get_redis_client().register_script(LOAD_TURN_STATE_SCRIPT)
+async_load_turn_state_script = get_async_redis_client().register_script(LOAD_TURN_STATE_SCRIPT)
 
 def get_mongo_client() -> pymongo.MongoClient:
-    """Initialize MongoDB client"""
-    return pymongo.MongoClient('mongodb://localhost:27017/')
+    """Get the shared MongoDB client"""
+    return mongo_client
 
 # Session management functions
 def create_session_id() -> str:
@@ -70,64 +110,120 @@ def create_session_id() -> str:
     return str(uuid.uuid4())
 
 def get_session_key(user_phone: str, session_id: str) -> str:
-    """Create Redis key for session"""
-    return f"sms_session:{user_phone}:{session_id}"
+    """Create Redis key for session metadata (hash)"""
+    return f"sms_session:{user_phone}:{session_id}:meta"
+
+def get_session_messages_key(user_phone: str, session_id: str) -> str:
+    """Create Redis key for session messages (list of JSON entries)"""
+    return f"sms_session:{user_phone}:{session_id}:messages"
+
+def get_active_session_key(user_phone: str) -> str:
+    """Create Redis key pointing at the user's active session ID"""
+    return f"active_session:{user_phone}"
 
 def get_user_sessions_key(user_phone: str) -> str:
     """Create Redis key for user's daily sessions"""
     today = datetime.now().strftime("%Y-%m-%d")
     return f"user_sessions:{user_phone}:{today}"
 
-def check_rate_limits(user_phone: str, redis_client: redis.Redis, config: SessionConfig) -> tuple[bool, str]:
-    """Check if user can start new session"""
+def check_rate_limits(user_phone: str, redis_client: Optional[redis.Redis], config: SessionConfig,
+                      sessions_today: Optional[str] = None, check_active_session: bool = True) -> tuple[bool, str]:
+    """
+    Check if user can start new session
+    sessions_today: today's session counter if already fetched (e.g. in a pipeline)
+    check_active_session: set False when the caller already knows there's no active session
+    redis_client is only used for what isn't passed in, so it may be None when both are given
+    """
     # Check daily session limit
-    sessions_today = redis_client.get(get_user_sessions_key(user_phone))
+    if sessions_today is None:
+        sessions_today = redis_client.get(get_user_sessions_key(user_phone))
     sessions_count = int(sessions_today) if sessions_today else 0
     
     if sessions_count >= config.max_sessions_per_day:
         return False, f"Daily limit reached. You can have {config.max_sessions_per_day} sessions per day. Try again tomorrow."
     
     # Check if there's an active session
-    active_session = get_active_session(user_phone, redis_client)
+    active_session = get_active_session(user_phone, redis_client) if check_active_session else None
     if active_session:
-        time_since_last = datetime.now() - datetime.fromisoformat(active_session['last_activity'])
-        if time_since_last.total_seconds() < config.session_timeout_minutes * 60:
+        if time.time() - active_session['last_activity_ts'] < config.session_timeout_minutes * 60:
             return False, f"Please wait {config.session_timeout_minutes} minutes before starting a new session."
     
     return True, ""
 
-def get_active_session(user_phone: str, redis_client: redis.Redis) -> Optional[SessionData]:
-    """Get user's active session if exists"""
-    # This is a simplified version - you might want to store active session IDs separately
-    keys = redis_client.keys(f"sms_session:{user_phone}:*")
-    for key in keys:
-        session_data = redis_client.get(key)
-        if session_data:
-            session = json.loads(session_data)
-            if session['is_active']:
-                return session
+def get_active_session(user_phone: str, redis_client: redis.Redis,
+                       session_id: Optional[str] = None) -> Optional[SessionData]:
+    """
+    Get user's active session if exists
+    session_id: active-session pointer value if already fetched (e.g. in a pipeline)
+    """
+    if session_id is None:
+        session_id = redis_client.get(get_active_session_key(user_phone))
+    if not session_id:
+        return None
+    session = load_session(user_phone, session_id, redis_client)
+    if session and session['is_active']:
+        return session
     return None
 
-def save_session(session_data: SessionData, redis_client: redis.Redis, config: SessionConfig):
-    """Save session to Redis"""
+def save_session(session_data: SessionData, redis_client: redis.Redis, config: SessionConfig,
+                 new_messages: Sequence[Dict[str, Any]] = (), is_new_session: bool = True):
+    """
+    Save session to Redis and keep the active-session pointer in sync
+    Only new_messages are appended (and the list capped), so a turn's write doesn't grow with the session history
+    is_new_session: False for an already stored session, so only the fields that change are written
+    redis_client may be a pipeline so the writes are batched with other commands
+    """
     key = get_session_key(session_data['user_phone'], session_data['session_id'])
-    redis_client.setex(
-        key, 
-        config.session_duration_hours * 3600,  # TTL in seconds
-        json.dumps(session_data, default=str)
+    messages_key = get_session_messages_key(session_data['user_phone'], session_data['session_id'])
+    ttl = config.session_duration_hours * 3600  # TTL in seconds
+    fields = {
+        'message_count': session_data['message_count'],
+        'last_activity_ts': session_data['last_activity_ts'],
+        'is_active': int(session_data['is_active'])
+    }
+    if is_new_session:
+        fields.update({
+            'session_id': session_data['session_id'],
+            'user_phone': session_data['user_phone'],
+            'session_start_ts': session_data['session_start_ts']
+        })
+    redis_client.hset(key, mapping=fields)
+    redis_client.expire(key, ttl)
+    if new_messages:
+        redis_client.rpush(messages_key, *(orjson.dumps(msg) for msg in new_messages))
+        # Only the context window is ever read back, so cap the list at that size
+        redis_client.ltrim(messages_key, -config.max_messages_per_session, -1)
+    redis_client.expire(messages_key, ttl)
+    
+    pointer_key = get_active_session_key(session_data['user_phone'])
+    if session_data['is_active']:
+        redis_client.setex(pointer_key, ttl, session_data['session_id'])
+    else:
+        redis_client.delete(pointer_key)
+
+def parse_session(session_hash: Dict[str, str]) -> Optional[SessionData]:
+    """Convert a session metadata hash read from Redis into SessionData"""
+    if not session_hash.get('session_start_ts'):
+        return None
+    return SessionData(
+        session_id=session_hash['session_id'],
+        user_phone=session_hash['user_phone'],
+        message_count=int(session_hash['message_count']),
+        session_start_ts=int(session_hash['session_start_ts']),
+        last_activity_ts=int(session_hash['last_activity_ts']),
+        is_active=session_hash['is_active'] == '1'
     )
 
 def load_session(user_phone: str, session_id: str, redis_client: redis.Redis) -> Optional[SessionData]:
-    """Load session from Redis"""
-    key = get_session_key(user_phone, session_id)
-    session_data = redis_client.get(key)
-    return json.loads(session_data) if session_data else None
+    """Load session metadata from Redis"""
+    return parse_session(redis_client.hgetall(get_session_key(user_phone, session_id)))
 
 def increment_daily_sessions(user_phone: str, redis_client: redis.Redis):
-    """Increment user's daily session count"""
+    """Increment user's daily session count (redis_client may be a sync or asyncio pipeline)"""
     key = get_user_sessions_key(user_phone)
+    # Create the counter with its expiry only if it doesn't exist, so the 24h window stays fixed
+    redis_client.set(key, 0, ex=86400, nx=True)
     redis_client.incr(key)
-    redis_client.expire(key, 86400)  # Expire after 24 hours
 
 def create_welcome_message(config: SessionConfig) -> str:
     """Create welcome message for new session"""
@@ -140,15 +236,20 @@ def create_session_end_message() -> str:
     """Create session end message"""
     return "Session ended. Thank you for using AgriAid! Start a new session anytime. 🌾"
 
-def should_end_session(session_data: SessionData, config: SessionConfig) -> tuple[bool, str]:
-    """Check if session should end"""
+def should_end_session(session_data: SessionData, config: SessionConfig,
+                       now_ts: Optional[int] = None) -> tuple[bool, str]:
+    """
+    Check if session should end
+    now_ts: current Unix time if the caller already has it
+    """
     # Check message limit
     if session_data['message_count'] >= config.max_messages_per_session:
         return True, f"Message limit ({config.max_messages_per_session}) reached. " + create_session_end_message()
     
     # Check time limit
-    session_start = datetime.fromisoformat(session_data['session_start'])
-    if datetime.now() - session_start > timedelta(hours=config.session_duration_hours):
+    if now_ts is None:
+        now_ts = int(time.time())
+    if now_ts - session_data['session_start_ts'] > config.session_duration_hours * 3600:
         return True, f"Session time ({config.session_duration_hours}h) expired. " + create_session_end_message()
     
     return False, ""
@@ -156,41 +257,56 @@ def should_end_session(session_data: SessionData, config: SessionConfig) -> tupl
 # LangGraph agent functions
 def create_model(tools):
     """Create the language model with tools"""
-    model = ChatOpenAI(model="gpt-4o", temperature=0.1).bind_tools(tools)
+    from langchain_openai import ChatOpenAI  # Imported on first use: the OpenAI SDK is slow to import
+    
+    # Let the model request several independent lookups in one turn; ToolNode runs them concurrently
+    model = ChatOpenAI(model="gpt-4o", temperature=0.1).bind_tools(tools, parallel_tool_calls=True)
     return model
 
+# The static part of the system prompt comes first so it's byte-identical across
+# turns and users (lets the provider's prompt caching reuse it); per-user details follow
+SYSTEM_PROMPT = (
+    "You are AgriAid, an intelligent assistant designed to help users with agricultural questions and issues, communicating via SMS.. \
+        Your goal is to provide accurate, actionable, and empathetic advice to farmers, gardeners, and agricultural professionals. "
+    "Keep responses under 300 characters when possible. Be helpful, concise, and practical. "
+    "Focus on actionable farming advice. Use simple language suitable for farmers. "
+    "If you need to use tools, do so to provide accurate information."
+    "If a user asked something and you can't get it from the tools use your training data. \
+        Also, if a user seems to have an issue that requires help from an agriculture specialist get the nearest agriculture centers information \
+            and contact and send together with recommended advice - this can happen in several ways e.g user can ask about pest issue or disease."
+    "A user may provide a county, subcounty, or ward name and they might misspell it, so you should try to match it with the correct name. \
+        That means you always should check if the provided county, subcounty, or ward name exists in the database before passing it to other tools. \
+            Meaning you should use the get_counties, get_subcounties, and get_wards tools to check if the provided names exist. \
+                If they don't exist, but you find similar matches that's from county to subcounty to ward then comfirm with the user \
+                    if the match is what they intended if not then inform them the provided location doesn't exist also inform them if no similar matches were found."
+    "Also if the user provides their phone number without a country code, you should assume it's a Kenyan number and add the country code +254.\
+        But also note if the number starts with 0 then you should remove the 0 and add the country code +254. "
+    "If a user asks for a functionality that is not available, politely inform them that the feature is not supported yet. "
+    "If a user wants to register a new agro center or farmer location first confirm if they are registered and if they are not ask them if they want to register and then register them. Then proceed with the registration of their agro centers or farms. "
+    "If a user asks for planting advice, use the ndvi_analysis_for_ai tool to analyze the NDVI data for their farm plus any training data you have and weather tools if necessary. "
+    "Also, if a user is new give them a brief overview of what services you provide, based on the tools and your internal data, and how you can help them. "
+    "If a user asks you to contact an agriculture center, you should use the send_message tool to send them a clear message but it should clearly be about help in regard to agriculture if not advise the user to ask about something in that sector. And also ask the user if they are willing for us to share their phone number that is the current user with the center for the center to contact them back. If not then inform them that you can't contact the center without sharing their phone number. "
+    "Do not update anyone's information if they are not the current user. For example, don't update an agro center if the user is not the registrar of that center, same to farmer location or user information. "
+)
+
+USER_PROMPT_TEMPLATE = (
+    "Also the user's phone number is {phone}. You can use this phone number for the tools that require it.\
+        But it's different from the phone number for the agriculture centers contact number but it's the registrar's number so don't ask for the registrar's number.."
+    "In the beginning of a message you should check if the user exists using the get_user_by_phone_number tool and pass in the user's phone number - {phone}  and if they don't ask them if they want to register and decide if you want to register them or not based their response. "
+    "Use their name in the welcome message if they are registered."
+)
+
+@lru_cache(maxsize=1024)
+def get_system_message(user_phone: str) -> SystemMessage:
+    """
+    Get the user's system message, built once and reused for every turn of their sessions
+    The fixed ID keeps add_messages from assigning (and mutating) one on the shared object
+    """
+    return SystemMessage(content=SYSTEM_PROMPT + USER_PROMPT_TEMPLATE.format(phone=user_phone), id="system")
+
 def model_call(state: AgentState) -> AgentState:
-    """Main model call function"""
-    system_prompt = SystemMessage(content=
-        "You are AgriAid, an intelligent assistant designed to help users with agricultural questions and issues, communicating via SMS.. \
-            Your goal is to provide accurate, actionable, and empathetic advice to farmers, gardeners, and agricultural professionals. "
-        "Keep responses under 300 characters when possible. Be helpful, concise, and practical. "
-        "Focus on actionable farming advice. Use simple language suitable for farmers. "
-        "If you need to use tools, do so to provide accurate information."
-        "If a user asked something and you can't get it from the tools use your training data. \
-            Also, if a user seems to have an issue that requires help from an agriculture specialist get the nearest agriculture centers information \
-                and contact and send together with recommended advice - this can happen in several ways e.g user can ask about pest issue or disease."
-        "A user may provide a county, subcounty, or ward name and they might misspell it, so you should try to match it with the correct name. \
-            That means you always should check if the provided county, subcounty, or ward name exists in the database before passing it to other tools. \
-                Meaning you should use the get_counties, get_subcounties, and get_wards tools to check if the provided names exist. \
-                    If they don't exist, but you find similar matches that's from county to subcounty to ward then comfirm with the user \
-                        if the match is what they intended if not then inform them the provided location doesn't exist also inform them if no similar matches were found."
-        "Also if the user provides their phone number without a country code, you should assume it's a Kenyan number and add the country code +254.\
-            But also note if the number starts with 0 then you should remove the 0 and add the country code +254. "
-        "If a user asks for a functionality that is not available, politely inform them that the feature is not supported yet. "
-        f"Also the user's phone number is {state['user_phone']}. You can use this phone number for the tools that require it.\
-            But it's different from the phone number for the agriculture centers contact number but it's the registrar's number so don't ask for the registrar's number.."
-        f"In the beginning of a message you should check if the user exists using the get_user_by_phone_number tool and pass in the user's phone number - {state['user_phone']}  and if they don't ask them if they want to register and decide if you want to register them or not based their response. "
-        "Use their name in the welcome message if they are registered."
-        "If a user wants to register a new agro center or farmer location first confirm if they are registered and if they are not ask them if they want to register and then register them. Then proceed with the registration of their agro centers or farms. "
-        "If a user asks for planting advice, use the ndvi_analysis_for_ai tool to analyze the NDVI data for their farm plus any training data you have and weather tools if necessary. "
-        "Also, if a user is new give them a brief overview of what services you provide, based on the tools and your internal data, and how you can help them. "
-        "If a user asks you to contact an agriculture center, you should use the send_message tool to send them a clear message but it should clearly be about help in regard to agriculture if not advise the user to ask about something in that sector. And also ask the user if they are willing for us to share their phone number that is the current user with the center for the center to contact them back. If not then inform them that you can't contact the center without sharing their phone number. "
-        "Do not update anyone's information if they are not the current user. For example, don't update an agro center if the user is not the registrar of that center, same to farmer location or user information. "
-    )
-    
-    model = create_model(tools)
-    response = model.invoke([system_prompt] + state["messages"])
+    """Main model call function (the system message is already first in state["messages"])"""
+    response = get_agent_model().invoke(state["messages"])
     
     return {
         "messages": [response],
@@ -209,10 +325,14 @@ def should_continue(state: AgentState) -> str:
 
 def create_agent_graph():
     """Create the LangGraph agent"""
+    from langgraph.graph import StateGraph, START, END
+    from langgraph.prebuilt import ToolNode
+    
     graph = StateGraph(state_schema=AgentState)
     
     # Add nodes
     graph.add_node("agent", model_call)
+    # ToolNode fans a turn's tool calls out in parallel (thread pool on invoke, asyncio.gather on ainvoke)
     tool_node = ToolNode(tools=tools)
     graph.add_node("tools", tool_node)
     
@@ -230,12 +350,224 @@ def create_agent_graph():
     
     return graph.compile()
 
+# Built once, on first use: binding tools serializes every tool schema and compiling the graph isn't free.
+# Deferring it keeps worker cold starts from paying for the OpenAI/LangGraph imports up front.
+@lru_cache(maxsize=None)
+def get_agent_model():
+    """Get the shared tool-bound model"""
+    return create_model(tools)
+
+@lru_cache(maxsize=None)
+def get_agent_graph():
+    """Get the shared compiled agent graph"""
+    return create_agent_graph()
+
 def truncate_message(message: str, max_length: int = 160) -> str:
     """Truncate message to SMS length"""
     if len(message) <= max_length:
         return message
     return message[:max_length-3] + "..."
 
+def start_sms_turn(
+    user_phone: str,
+    message_text: str,
+    active_session: Optional[SessionData],
+    history: List[Dict[str, Any]],
+    config: SessionConfig
+) -> Tuple[Optional[str], SessionData, Optional[AgentState], Dict[str, Any]]:
+    """
+    Create or continue the session for an incoming message and build the agent input.
+    No I/O - shared by the sync and async entry points.
+    history: the most recent stored messages of the active session (context window)
+    
+    Returns (reply, session_data, agent_state, human_message):
+    - agent_state is None when the session just ended; reply is the end message and
+      session_data (now inactive) still needs saving
+    - otherwise reply is None and agent_state is ready for the agent
+    human_message is the stored entry for message_text, saved with the agent's reply
+    """
+    now = datetime.now()
+    now_ts = int(now.timestamp())
+    human_message = {
+        'type': 'human',
+        'content': message_text,
+        'timestamp': now.isoformat()
+    }
+    
+    if not active_session:
+        # Create new session
+        session_id = create_session_id()
+        session_data = SessionData(
+            session_id=session_id,
+            user_phone=user_phone,
+            message_count=0,
+            session_start_ts=now_ts,
+            last_activity_ts=now_ts,
+            is_active=True
+        )
+        
+        # Process the actual message
+        session_data['message_count'] = 1
+        history = []
+        
+    else:
+        session_data = active_session
+        
+        # Check if session should end
+        should_end, end_message = should_end_session(session_data, config, now_ts)
+        if should_end:
+            session_data['is_active'] = False
+            return end_message, session_data, None, human_message
+        
+        session_data['message_count'] += 1
+    
+    # Prepare messages for agent
+    messages = [get_system_message(user_phone)]
+    for msg in (history + [human_message])[-config.max_messages_per_session:]:  # Keep last 10 messages for context
+        if msg['type'] == 'human':
+            messages.append(HumanMessage(content=msg['content']))
+        elif msg['type'] == 'ai':
+            messages.append(AIMessage(content=msg['content']))
+    
+    # Add current message if not already added
+    if messages[-1].content != message_text:
+        messages.append(HumanMessage(content=message_text))
+    
+    # Create agent state
+    agent_state = AgentState(
+        messages=messages,
+        session_id=session_data['session_id'],
+        user_phone=user_phone,
+        message_count=session_data['message_count'],
+        session_start=datetime.fromtimestamp(session_data['session_start_ts'])
+    )
+    
+    return None, session_data, agent_state, human_message
+
+TurnState = Tuple[Optional[SessionData], List[Dict[str, Any]], Optional[str]]
+
+def get_turn_state_script_args(user_phone: str, session_id: str, config: SessionConfig) -> Dict[str, list]:
+    """Keys and args for load_turn_state_script, given the active session ID ('' for none)"""
+    return {
+        'keys': [get_active_session_key(user_phone), get_user_sessions_key(user_phone),
+                 get_session_key(user_phone, session_id), get_session_messages_key(user_phone, session_id)],
+        'args': [session_id, -config.max_messages_per_session]
+    }
+
+def parse_turn_state(raw: list) -> TurnState:
+    """Convert load_turn_state_script's reply into (active_session, history, sessions_today)"""
+    sessions_today, active_session_id, session_fields, entries = raw
+    sessions_today = sessions_today or None
+    if not active_session_id:
+        return None, [], sessions_today
+    
+    # HGETALL comes back from Lua as a flat [field, value, ...] list
+    active_session = parse_session(dict(zip(session_fields[::2], session_fields[1::2])))
+    if not active_session or not active_session['is_active']:
+        return None, [], sessions_today
+    return active_session, [orjson.loads(entry) for entry in entries], sessions_today
+
+def load_sms_turn_state(user_phone: str, redis_client: redis.Redis, config: SessionConfig) -> TurnState:
+    """Load the user's active session, its recent messages and today's session count"""
+    session_id = redis_client.get(get_active_session_key(user_phone)) or ''
+    for _ in range(TURN_STATE_MAX_ATTEMPTS):
+        raw = load_turn_state_script(**get_turn_state_script_args(user_phone, session_id, config), client=redis_client)
+        if raw[0]:
+            return parse_turn_state(raw[1:])
+        session_id = raw[1]
+    raise redis.WatchError(f"Active session for {user_phone} kept changing while loading it")
+
+async def load_sms_turn_state_async(user_phone: str, redis_client: aioredis.Redis, config: SessionConfig) -> TurnState:
+    """Async version of load_sms_turn_state"""
+    session_id = await redis_client.get(get_active_session_key(user_phone)) or ''
+    for _ in range(TURN_STATE_MAX_ATTEMPTS):
+        raw = await async_load_turn_state_script(**get_turn_state_script_args(user_phone, session_id, config),
+                                                 client=redis_client)
+        if raw[0]:
+            return parse_turn_state(raw[1:])
+        session_id = raw[1]
+    raise redis.WatchError(f"Active session for {user_phone} kept changing while loading it")
+
+@dataclass
+class SmsTurn:
+    """An incoming message that is ready for the agent"""
+    session_data: SessionData
+    agent_state: AgentState
+    human_message: Dict[str, Any]
+    is_new_session: bool
+
+def begin_sms_turn(
+    user_phone: str,
+    message_text: str,
+    turn_state: TurnState,
+    pipe: redis.client.Pipeline,
+    config: SessionConfig
+) -> Tuple[Optional[str], Optional[SmsTurn]]:
+    """
+    Decide how to handle an incoming message given its loaded turn state.
+    Returns (reply, None) when the message is answered without the agent (rate limit,
+    session end; any writes are queued on pipe), otherwise (None, turn).
+    pipe may be a sync or asyncio pipeline; commands are only queued here.
+    """
+    active_session, history, sessions_today = turn_state
+    
+    if not active_session:
+        # Check rate limits for new session
+        can_start, limit_message = check_rate_limits(
+            user_phone, None, config,
+            sessions_today=sessions_today or "0",
+            check_active_session=False
+        )
+        if not can_start:
+            return limit_message, None
+    
+    reply, session_data, agent_state, human_message = start_sms_turn(
+        user_phone, message_text, active_session, history, config
+    )
+    if agent_state is None:
+        save_session(session_data, pipe, config, is_new_session=False)
+        return reply, None
+    
+    return None, SmsTurn(session_data, agent_state, human_message, not active_session)
+
+def finish_sms_turn(
+    turn: SmsTurn,
+    ai_message: str,
+    pipe: redis.client.Pipeline,
+    config: SessionConfig
+) -> str:
+    """
+    Record the agent's reply and queue the session writes on pipe (caller executes it).
+    Returns the SMS response text.
+    """
+    # ai_message = truncate_message(ai_message, config.max_sms_length)
+    session_data = turn.session_data
+    
+    # Update session with AI response
+    now = datetime.now()
+    ai_entry = {
+        'type': 'ai',
+        'content': ai_message,
+        'timestamp': now.isoformat()
+    }
+    session_data['last_activity_ts'] = int(now.timestamp())
+    
+    # Save updated session (and count new sessions) in one round trip
+    save_session(session_data, pipe, config, new_messages=[turn.human_message, ai_entry],
+                 is_new_session=turn.is_new_session)
+    if turn.is_new_session:
+        increment_daily_sessions(session_data['user_phone'], pipe)
+    
+    # Return response (prepend welcome message for new sessions)
+    if turn.is_new_session:
+        return f"{create_welcome_message(config)}\n\n{ai_message}"
+    
+    return ai_message
+
+def create_error_message(error: Exception) -> str:
+    """Create the SMS reply for a message that failed to process"""
+    return f"Sorry, I encountered an error. Please try again. Error: {str(error)[:50]}"
+
 def process_sms_message(
     user_phone: str, 
     message_text: str, 
@@ -245,111 +577,131 @@ def process_sms_message(
     redis_client = get_redis_client()
     
     try:
-        # Check for active session
-        active_session = get_active_session(user_phone, redis_client)
-        
-        if not active_session:
-            # Check rate limits for new session
-            can_start, limit_message = check_rate_limits(user_phone, redis_client, config)
-            if not can_start:
-                return limit_message
-            
-            # Create new session
-            session_id = create_session_id()
-            session_data = SessionData(
-                session_id=session_id,
-                user_phone=user_phone,
-                messages=[],
-                message_count=0,
-                session_start=datetime.now().isoformat(),
-                last_activity=datetime.now().isoformat(),
-                is_active=True
-            )
+        turn_state = load_sms_turn_state(user_phone, redis_client, config)
+        with redis_client.pipeline(transaction=False) as pipe:
+            reply, turn = begin_sms_turn(user_phone, message_text, turn_state, pipe, config)
+            if turn is None:
+                pipe.execute()
+                return reply
             
-            increment_daily_sessions(user_phone, redis_client)
+            # Run agent
+            result = get_agent_graph().invoke(turn.agent_state)
             
-            # Send welcome message first
-            welcome_msg = create_welcome_message(config)
+            # Get AI response
+            response = finish_sms_turn(turn, result["messages"][-1].content, pipe, config)
+            pipe.execute()
+            return response
+        
+    except Exception as e:
+        return create_error_message(e)
+
+async def process_sms_message_async(
+    user_phone: str, 
+    message_text: str, 
+    config: SessionConfig = SessionConfig()
+) -> str:
+    """
+    Async version of process_sms_message for use inside an event loop (e.g. FastAPI).
+    Redis goes through redis.asyncio and the agent runs via ainvoke, so neither blocks
+    the loop, and the ToolNode runs the requested tool calls concurrently (sync tools
+    are run in a thread pool).
+    """
+    redis_client = get_async_redis_client()
+    
+    try:
+        turn_state = await load_sms_turn_state_async(user_phone, redis_client, config)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            reply, turn = begin_sms_turn(user_phone, message_text, turn_state, pipe, config)
+            if turn is None:
+                await pipe.execute()
+                return reply
             
-            # Process the actual message
-            session_data['message_count'] = 1
-            session_data['messages'].append({
-                'type': 'human',
-                'content': message_text,
-                'timestamp': datetime.now().isoformat()
-            })
+            # Run agent
+            result = await get_agent_graph().ainvoke(turn.agent_state)
             
+            # Get AI response
+            response = finish_sms_turn(turn, result["messages"][-1].content, pipe, config)
+            await pipe.execute()
+            return response
+        
+    except Exception as e:
+        return create_error_message(e)
+
+async def process_sms_batch(
+    sms_messages: List[Tuple[str, str]],
+    config: SessionConfig = SessionConfig(),
+    max_concurrency: int = 10
+) -> List[str]:
+    """
+    Process a burst of incoming SMS messages, given as (user_phone, message_text) pairs.
+    All agent runs go through a single agent_graph.abatch call (at most max_concurrency
+    at a time) and the session writes for the whole batch share one pipeline.
+    Returns the responses in the same order as sms_messages.
+    """
+    redis_client = get_async_redis_client()
+    responses: List[Optional[str]] = [None] * len(sms_messages)
+    turns: List[Tuple[int, SmsTurn]] = []
+    batched: List[int] = []
+    deferred: List[int] = []
+    batch_phones = set()
+    
+    for i, (user_phone, _) in enumerate(sms_messages):
+        # A second message from the same user depends on the first one's session state
+        if user_phone in batch_phones:
+            deferred.append(i)
         else:
-            session_data = active_session
-            
-            # Check if session should end
-            should_end, end_message = should_end_session(session_data, config)
-            if should_end:
-                session_data['is_active'] = False
-                save_session(session_data, redis_client, config)
-                return end_message
+            batch_phones.add(user_phone)
+            batched.append(i)
+    
+    # Load every sender's session state concurrently
+    turn_states = await asyncio.gather(
+        *(load_sms_turn_state_async(sms_messages[i][0], redis_client, config) for i in batched),
+        return_exceptions=True
+    )
+    
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for i, turn_state in zip(batched, turn_states):
+            user_phone, message_text = sms_messages[i]
+            if isinstance(turn_state, Exception):
+                responses[i] = create_error_message(turn_state)
+                continue
             
-            session_data['message_count'] += 1
-            session_data['messages'].append({
-                'type': 'human',
-                'content': message_text,
-                'timestamp': datetime.now().isoformat()
-            })
+            reply, turn = begin_sms_turn(user_phone, message_text, turn_state, pipe, config)
+            if turn is None:
+                responses[i] = reply
+            else:
+                turns.append((i, turn))
         
-        # Prepare messages for agent
-        messages = []
-        for msg in session_data['messages'][-config.max_messages_per_session:]:  # Keep last 10 messages for context
-            if msg['type'] == 'human':
-                messages.append(HumanMessage(content=msg['content']))
-            elif msg['type'] == 'ai':
-                messages.append(AIMessage(content=msg['content']))
-        
-        # Add current message if not already added
-        if not messages or messages[-1].content != message_text:
-            messages.append(HumanMessage(content=message_text))
-        
-        # Create agent state
-        agent_state = AgentState(
-            messages=messages,
-            session_id=session_data['session_id'],
-            user_phone=user_phone,
-            message_count=session_data['message_count'],
-            session_start=datetime.fromisoformat(session_data['session_start'])
+        # Run agents
+        results = await get_agent_graph().abatch(
+            [turn.agent_state for _, turn in turns],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True
         )
         
-        # Run agent
-        agent = create_agent_graph()
-        result = agent.invoke(agent_state)
-        
-        # Get AI response
-        ai_message = result["messages"][-1].content
-        # ai_message = truncate_message(ai_message, config.max_sms_length)
-        
-        # Update session with AI response
-        session_data['messages'].append({
-            'type': 'ai',
-            'content': ai_message,
-            'timestamp': datetime.now().isoformat()
-        })
-        session_data['last_activity'] = datetime.now().isoformat()
+        # Replies that are only valid once the pipelined session writes land
+        pending: List[int] = []
+        for (i, turn), result in zip(turns, results):
+            if isinstance(result, Exception):
+                responses[i] = create_error_message(result)
+            else:
+                responses[i] = finish_sms_turn(turn, result["messages"][-1].content, pipe, config)
+                pending.append(i)
         
-        # Save updated session
-        save_session(session_data, redis_client, config)
-        
-        # Return response (prepend welcome message for new sessions)
-        if not active_session:
-            return f"{welcome_msg}\n\n{ai_message}"
-        
-        return ai_message
-        
-    except Exception as e:
-        return f"Sorry, I encountered an error. Please try again. Error: {str(e)[:50]}"
+        try:
+            await pipe.execute()
+        except Exception as e:
+            # Keep rate-limit and per-turn error replies; only the pending turns failed to save
+            for i in pending:
+                responses[i] = create_error_message(e)
+    
+    for i in deferred:
+        responses[i] = await process_sms_message_async(*sms_messages[i], config)
     
-    finally:
-        redis_client.close()
+    return responses
 
 # Example usage and testing
-def main():
+async def main():
     """Example usage"""
     config = SessionConfig(
         max_messages_per_session=30,  # Lower for testing
@@ -363,7 +715,7 @@ def main():
         user_input = input("\nEnter your message (or 'exit' to quit): ")
         if user_input.lower() == 'exit':
             break
-        response = process_sms_message(user_phone, user_input, config)
+        response = await process_sms_message_async(user_phone, user_input, config)
         print(f"\nAgriAid: {response}\n")
 
 if __name__ == "__main__":
@@ -12,13 +12,22 @@ System Architecture:
 
 from typing import List, Dict, Any, Optional
 from datetime import datetime, time
-import json
+from functools import partial
+import logging
 from langchain_core.tools import tool
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-from db.db_manager import db_manager
+from db.db_manager import db_manager, CENTER_PROJECTION
 from models.models import DayOfWeek, Location, AgroCenter, Availability
 from models.models import RegistrationResponse, SearchResponse
 from .utils import generate_center_id, _clear_location_cache, _update_center_rating
+from .utils import MAX_CENTERS_PER_WARD, _reserve_ward_slot, _release_ward_slot
+from .utils import encode_page_cursor, decode_page_cursor, _cached_location_query, _store_location_result
+
+logger = logging.getLogger(__name__)
+
+TOP_CENTERS_CACHE_TTL = 1800  # 30 minutes
 
 # ================================
 # CORE AGRO CENTERS FUNCTIONS
@@ -53,37 +62,17 @@ def register_agro_center(
         ward=ward
     )
     try:
-        # Check ward limit (max 5 centers per ward)
-        ward_count = db_manager.centers_collection.count_documents({
-            "location.county": location.county,
-            "location.subcounty": location.subcounty,
-            "location.ward": location.ward,
-            "active": True
-        })
-        
-        if ward_count >= 5:
+        # Take one of the ward's slots (max 5 centers per ward) before inserting
+        if not _reserve_ward_slot(location):
             return RegistrationResponse(
                 success=False,
-                message="Maximum 5 centers allowed per ward. Registration failed.",
+                message=f"Maximum {MAX_CENTERS_PER_WARD} centers allowed per ward. Registration failed.",
                 errors=["Ward limit exceeded"]
             )
         
         # Generate center ID
         center_id = generate_center_id(location, contact_number)
-        print(f"Generated center ID: {center_id}")
-        
-        # Check if center already exists
-        existing = db_manager.centers_collection.find_one({
-            "center_id": center_id,
-            "active": True
-        })
-        
-        if existing:
-            return RegistrationResponse(
-                success=False,
-                message="Center with this contact and location already exists.",
-                errors=["Duplicate center"]
-            )
+        logger.debug("Generated center ID: %s", center_id)
         
         # Create new center
         new_center = AgroCenter(
@@ -96,11 +85,22 @@ def register_agro_center(
             availability=availability
         )
 
-        print(f"New center data: {new_center}")
-        print(f"New center data: {new_center.to_dict()}")
+        logger.debug("New center data: %s", new_center)
         
-        # Save to database
-        db_manager.centers_collection.insert_one(new_center.to_dict())
+        # Save to database; the unique index on active center_id rejects duplicates.
+        # The reserved slot is handed back if the center isn't saved.
+        try:
+            db_manager.centers_collection.insert_one(new_center.to_dict())
+        except DuplicateKeyError:
+            _release_ward_slot(location)
+            return RegistrationResponse(
+                success=False,
+                message="Center with this contact and location already exists.",
+                errors=["Duplicate center"]
+            )
+        except Exception:
+            _release_ward_slot(location)
+            raise
         
         # Clear relevant caches
         _clear_location_cache(location)
@@ -112,7 +112,7 @@ def register_agro_center(
         )
         
     except Exception as e:
-        print(f"Error during registration: {e}")
+        logger.error("Error during registration: %s", e)
         return RegistrationResponse(
             success=False,
             message=f"Registration failed due to system error: {e}.",
@@ -120,31 +120,29 @@ def register_agro_center(
         )
 
 
-def get_centers_by_location(
-    county: str,
-    subcounty: str,
-    ward: str,
-    offset: int = 0,
-    limit: int = 5,
-    sort_by_rating: bool = True
+def _search_response_to_json(result: SearchResponse) -> Dict[str, Any]:
+    return {
+        "centers": [c.to_dict() for c in result.centers],
+        "has_more": result.has_more,
+        "next_cursor": result.next_cursor
+    }
+
+
+def _search_response_from_json(data: Dict[str, Any]) -> SearchResponse:
+    return SearchResponse(
+        centers=[AgroCenter.from_dict(c) for c in data["centers"]],
+        has_more=data["has_more"],
+        next_cursor=data["next_cursor"]
+    )
+
+
+def _query_centers_by_location(
+    location: Location,
+    cursor: Optional[str],
+    limit: int,
+    sort_by_rating: bool
 ) -> SearchResponse:
-    """Get agro centers by location with pagination"""
-    print(f"Fetching centers for {county}, {subcounty}, {ward} with offset={offset}, limit={limit}, sort_by_rating={sort_by_rating}")
-    location = Location(county=county, subcounty=subcounty, ward=ward)
-    cache_key = f"centers:{location.county}:{location.subcounty}:{location.ward}:{offset}:{limit}:{sort_by_rating}"
-    
-    # Try cache first for USSD speed
-    cached = db_manager.redis_client.get(cache_key)
-    if cached:
-        data = json.loads(cached)
-        return SearchResponse(
-            centers=[AgroCenter.from_dict(c) for c in data["centers"]],
-            total_count=data["total_count"],
-            has_more=data["has_more"],
-            next_offset=data["next_offset"]
-        )
-    
-    # Query database
+    """Database query behind get_centers_by_location"""
     query = {
         "location.county": location.county,
         "location.subcounty": location.subcounty,
@@ -152,32 +150,65 @@ def get_centers_by_location(
         "active": True
     }
     
-    sort_criteria = [("rating.average_rating", -1)] if sort_by_rating else [("created_at", -1)]
+    # Sort on the chosen field, with center_id as a unique tie-breaker so the order is total
+    sort_field = "rating.average_rating" if sort_by_rating else "created_at"
+    sort_criteria = [(sort_field, -1), ("center_id", 1)]
     
-    cursor = db_manager.centers_collection.find(query).sort(sort_criteria)
-    total_count = db_manager.centers_collection.count_documents(query)
+    if cursor:
+        last = decode_page_cursor(cursor)
+        query["$or"] = [
+            {sort_field: {"$lt": last["value"]}},
+            {sort_field: last["value"], "center_id": {"$gt": last["center_id"]}}
+        ]
     
-    centers_data = list(cursor.skip(offset).limit(limit))
+    # Fetch one extra document to know whether there's another page
+    centers_data = list(db_manager.centers_collection.find(query, CENTER_PROJECTION).sort(sort_criteria).limit(limit + 1))
+    has_more = len(centers_data) > limit
+    centers_data = centers_data[:limit]
     centers = [AgroCenter.from_dict(data) for data in centers_data]
     
-    has_more = (offset + limit) < total_count
-    next_offset = offset + limit if has_more else offset
-    
-    # Cache result
-    cache_data = {
-        "centers": [c.to_dict() for c in centers],
-        "total_count": total_count,
-        "has_more": has_more,
-        "next_offset": next_offset
-    }
-    
-    db_manager.redis_client.setex(cache_key, db_manager.cache_ttl, json.dumps(cache_data))
+    next_cursor = None
+    if has_more:
+        last_doc = centers_data[-1]
+        last_value = last_doc["rating"]["average_rating"] if sort_by_rating else last_doc["created_at"]
+        next_cursor = encode_page_cursor({"value": last_value, "center_id": last_doc["center_id"]})
     
     return SearchResponse(
         centers=centers,
-        total_count=total_count,
         has_more=has_more,
-        next_offset=next_offset
+        next_cursor=next_cursor
+    )
+
+
+def get_centers_by_location(
+    county: str,
+    subcounty: str,
+    ward: str,
+    cursor: Optional[str] = None,
+    limit: int = 5,
+    sort_by_rating: bool = True
+) -> SearchResponse:
+    """
+    Get agro centers by location with pagination
+    - cursor: next_cursor from the previous page's response (omit for the first page)
+    Pages are keyset-based: each page continues after the last center of the previous one
+    instead of skipping over everything before it.
+    """
+    logger.debug(
+        "Fetching centers for %s, %s, %s with cursor=%s, limit=%s, sort_by_rating=%s",
+        county, subcounty, ward, cursor, limit, sort_by_rating
+    )
+    location = Location(county=county, subcounty=subcounty, ward=ward)
+    cache_key = f"centers:{location.county}:{location.subcounty}:{location.ward}:{cursor or ''}:{limit}:{sort_by_rating}"
+    
+    # Cached for USSD speed (in-process, then Redis), falling back to the database
+    return _cached_location_query(
+        location,
+        cache_key,
+        db_manager.cache_ttl,
+        partial(_query_centers_by_location, location, cursor, limit, sort_by_rating),
+        _search_response_to_json,
+        _search_response_from_json
     )
 
 
@@ -188,7 +219,7 @@ def get_user_centers(
     centers_data = db_manager.centers_collection.find({
         "registrar_number": registrar_number,
         "active": True
-    }).sort("created_at", -1)
+    }, CENTER_PROJECTION).sort("created_at", -1)
     
     return [AgroCenter.from_dict(data) for data in centers_data]
 
@@ -226,7 +257,7 @@ def update_agro_center(
             "center_id": center_id,
             "registrar_number": registrar_number,
             "active": True
-        })
+        }, {"location": 1})
         
         if not center:
             return RegistrationResponse(
@@ -243,7 +274,7 @@ def update_agro_center(
         
         # Update database
         db_manager.centers_collection.update_one(
-            {"center_id": center_id},
+            {"center_id": center_id, "active": True},
             {"$set": update_data}
         )
         
@@ -276,7 +307,7 @@ def delete_agro_center(
             "center_id": center_id,
             "registrar_number": registrar_number,
             "active": True
-        })
+        }, {"location": 1})
         
         if not center:
             return RegistrationResponse(
@@ -286,8 +317,8 @@ def delete_agro_center(
             )
         
         # Soft delete
-        db_manager.centers_collection.update_one(
-            {"center_id": center_id},
+        result = db_manager.centers_collection.update_one(
+            {"center_id": center_id, "active": True},
             {
                 "$set": {
                     "active": False,
@@ -296,8 +327,12 @@ def delete_agro_center(
             }
         )
         
-        # Clear caches
+        # Free the ward slot (only once, even if two deletes race)
         location = Location.from_dict(center["location"])
+        if result.modified_count:
+            _release_ward_slot(location)
+        
+        # Clear caches
         _clear_location_cache(location)
         
         return RegistrationResponse(
@@ -328,38 +363,25 @@ def rate_agro_center(
                 errors=["Invalid rating"]
             )
         
-        # Check if user already rated this center
-        existing_rating = db_manager.ratings_collection.find_one({
-            "center_id": center_id,
-            "rater_phone": rater_phone
-        })
-        
-        if existing_rating:
-            # Update existing rating
-            old_rating = existing_rating["rating"]
-            db_manager.ratings_collection.update_one(
-                {"_id": existing_rating["_id"]},
-                {
-                    "$set": {
-                        "rating": rating,
-                        "updated_at": datetime.now().isoformat()
-                    }
-                }
-            )
-            rating_change = rating - old_rating
-        else:
-            # Create new rating
-            db_manager.ratings_collection.insert_one({
-                "center_id": center_id,
-                "rater_phone": rater_phone,
-                "rating": rating,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            })
-            rating_change = rating
+        # Record the rating (insert or overwrite), getting back the previous one in the same round trip
+        now = datetime.now().isoformat()
+        existing_rating = db_manager.ratings_collection.find_one_and_update(
+            {"center_id": center_id, "rater_phone": rater_phone},
+            {
+                "$set": {"rating": rating, "updated_at": now},
+                "$setOnInsert": {"created_at": now}
+            },
+            projection={"rating": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        rating_change = rating - existing_rating["rating"] if existing_rating else rating
         
-        # Update center's rating summary
-        _update_center_rating(center_id, rating_change, not existing_rating)
+        # Update center's rating summary, then refresh the ward's cached results with the new ratings
+        location = _update_center_rating(center_id, rating_change, not existing_rating)
+        if location:
+            _clear_location_cache(location)
+            refresh_top_rated_centers(location)
         
         return RegistrationResponse(
             success=True,
@@ -375,42 +397,88 @@ def rate_agro_center(
         )
 
 
-def get_top_rated_centers(
-    county: str,
-    subcounty: str,
-    ward: str,
-    limit: int = 3
-) -> List[AgroCenter]:
-    """Get top-rated centers for quick USSD response"""
-    location = Location(county=county, subcounty=subcounty, ward=ward)
-    cache_key = f"top_centers:{location.county}:{location.subcounty}:{location.ward}:{limit}"
-    
-    cached = db_manager.redis_client.get(cache_key)
-    if cached:
-        data = json.loads(cached)
-        return [AgroCenter.from_dict(c) for c in data]
-    
+def _query_top_rated_centers(location: Location, limit: int) -> List[AgroCenter]:
+    """Database query behind get_top_rated_centers"""
     centers_data = db_manager.centers_collection.find({
         "location.county": location.county,
         "location.subcounty": location.subcounty,
         "location.ward": location.ward,
         "active": True,
         "rating.total_ratings": {"$gt": 0}  # Only centers with ratings
-    }).sort([
+    }, CENTER_PROJECTION).sort([
         ("rating.average_rating", -1),
         ("rating.total_ratings", -1)
     ]).limit(limit)
     
-    centers = [AgroCenter.from_dict(data) for data in centers_data]
+    return [AgroCenter.from_dict(data) for data in centers_data]
+
+
+def _top_centers_cache_key(location: Location, limit: int) -> str:
+    return f"top_centers:{location.county}:{location.subcounty}:{location.ward}:{limit}"
+
+
+def _top_centers_to_json(centers: List[AgroCenter]) -> List[Dict[str, Any]]:
+    return [c.to_dict() for c in centers]
+
+
+def get_top_rated_centers(
+    county: str,
+    subcounty: str,
+    ward: str,
+    limit: int = 3
+) -> List[AgroCenter]:
+    """Get top-rated centers for quick USSD response"""
+    location = Location(county=county, subcounty=subcounty, ward=ward)
     
-    # Cache for 30 minutes
-    db_manager.redis_client.setex(
-        cache_key, 
-        1800, 
-        json.dumps([c.to_dict() for c in centers])
+    return _cached_location_query(
+        location,
+        _top_centers_cache_key(location, limit),
+        TOP_CENTERS_CACHE_TTL,
+        partial(_query_top_rated_centers, location, limit),
+        _top_centers_to_json,
+        lambda data: [AgroCenter.from_dict(c) for c in data]
+    )
+
+
+def refresh_top_rated_centers(location: Location, limit: int = 3):
+    """Recompute a ward's top-rated centers and write them through to the cache"""
+    _store_location_result(
+        location,
+        _top_centers_cache_key(location, limit),
+        TOP_CENTERS_CACHE_TTL,
+        _query_top_rated_centers(location, limit),
+        _top_centers_to_json
     )
+
+
+def warm_top_rated_cache(limit: int = 3) -> int:
+    """
+    Pre-compute top-rated centers for every ward that has rated centers (run at startup),
+    so the first USSD user after a deploy doesn't pay for the query.
+    Returns the number of wards cached.
+    """
+    groups = db_manager.centers_collection.aggregate([
+        {"$match": {"active": True, "rating.total_ratings": {"$gt": 0}}},
+        {"$project": CENTER_PROJECTION},
+        {"$sort": {"rating.average_rating": -1, "rating.total_ratings": -1}},
+        {"$group": {"_id": "$location", "centers": {"$push": "$$ROOT"}}},
+        {"$project": {"centers": {"$slice": ["$centers", limit]}}}
+    ])
+    
+    wards = 0
+    for group in groups:
+        location = Location.from_dict(group["_id"])
+        centers = [AgroCenter.from_dict(data) for data in group["centers"]]
+        _store_location_result(
+            location,
+            _top_centers_cache_key(location, limit),
+            TOP_CENTERS_CACHE_TTL,
+            centers,
+            _top_centers_to_json
+        )
+        wards += 1
     
-    return centers
+    return wards
 
 # ================================
 # USAGE EXAMPLE
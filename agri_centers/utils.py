@@ -1,60 +1,253 @@
+import base64
 import hashlib
+from functools import lru_cache
+import math
+import orjson
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
 from models.models import Location, AgroCenter
+from cachetools import TTLCache
+from pymongo.errors import DuplicateKeyError
 from db.db_manager import db_manager
 
+# Per-process L1 cache in front of Redis for hot USSD reads (holds the built results).
+# Invalidations are broadcast so every process drops its copy; the short TTL is the fallback
+# for a process that missed the message.
+_l1_cache = TTLCache(maxsize=2048, ttl=60)
+_l1_lock = threading.Lock()
+
+# Maximum number of active centers per ward
+MAX_CENTERS_PER_WARD = 5
+
+# Pub/sub channel announcing which location's cached results were invalidated
+LOCATION_INVALIDATION_CHANNEL = "inv:centers"
+
+# Unlinks every key tagged for a location plus the tag set itself and announces the
+# invalidation to the other processes, in a single round trip
+CLEAR_TAGGED_KEYS_SCRIPT = """
+local keys = redis.call('SMEMBERS', KEYS[1])
+for i = 1, #keys, 1000 do
+    redis.call('UNLINK', unpack(keys, i, math.min(i + 999, #keys)))
+end
+redis.call('UNLINK', KEYS[1])
+return redis.call('PUBLISH', ARGV[1], ARGV[2])
+"""
+clear_tagged_keys_script = db_manager.redis_client.register_script(CLEAR_TAGGED_KEYS_SCRIPT)
+
+@lru_cache(maxsize=4096)
 def generate_center_id(location: Location, contact_number: str) -> str:
     """Generate unique center ID"""
     data = f"{location.county}_{location.subcounty}_{location.ward}_{contact_number}"
-    return hashlib.md5(data.encode()).hexdigest()[:12]
+    # MD5 only derives a stable ID here; existing records are looked up by it, so keep the algorithm
+    return hashlib.md5(data.encode(), usedforsecurity=False).hexdigest()[:12]
+
+def encode_page_cursor(position: Dict[str, Any]) -> str:
+    """Encode a keyset pagination position as an opaque, URL-safe cursor string"""
+    return base64.urlsafe_b64encode(orjson.dumps(position)).decode()
+
+def decode_page_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor created by encode_page_cursor"""
+    return orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+def _l1_get(cache_key: str) -> Any:
+    """Get a result from the in-process cache (None on miss)"""
+    with _l1_lock:
+        return _l1_cache.get(cache_key)
+
+def _l1_set(cache_key: str, value: Any):
+    """Store a result in the in-process cache"""
+    with _l1_lock:
+        _l1_cache[cache_key] = value
+
+def _location_tag_key(location: Location) -> str:
+    """Redis set holding every cache key derived from a location's centers"""
+    return f"tag:ward:{location.county}:{location.subcounty}:{location.ward}"
+
+def _cache_location_result(location: Location, cache_key: str, ttl: int, value: bytes):
+    """Cache a location query result in Redis and tag it for invalidation, in one round trip"""
+    tag_key = _location_tag_key(location)
+    pipe = db_manager.redis_client.pipeline(transaction=False)
+    pipe.setex(cache_key, ttl, value)
+    pipe.sadd(tag_key, cache_key)
+    # Outlive every tagged entry (they use at most cache_ttl)
+    pipe.expire(tag_key, max(ttl, db_manager.cache_ttl))
+    pipe.execute()
+
+def _should_refresh_early(entry: Dict[str, Any], beta: float = 1.0) -> bool:
+    """
+    Probabilistic early expiration (XFetch): the closer the entry is to its soft expiry,
+    and the longer it took to compute, the likelier a reader recomputes it ahead of time.
+    """
+    return time.time() - entry["delta"] * beta * math.log(1.0 - random.random()) >= entry["soft_expiry"]
+
+def _acquire_refresh_lock(cache_key: str, timeout: int = 5) -> bool:
+    """Single-flight: only the reader that gets the lock recomputes an entry early"""
+    return bool(db_manager.redis_client.set(f"lock:{cache_key}", 1, nx=True, ex=timeout))
+
+def _cached_location_query(
+    location: Location,
+    cache_key: str,
+    ttl: int,
+    compute: Callable[[], Any],
+    to_json: Callable[[Any], Any],
+    from_json: Callable[[Any], Any]
+) -> Any:
+    """
+    Cache-aside read of a location query: in-process L1, then Redis, then compute().
+    Redis entries carry their soft expiry and compute time so one reader refreshes a hot
+    key shortly before it expires while the others keep serving the cached value,
+    instead of every reader hitting the database at once when it expires.
+    """
+    result = _l1_get(cache_key)
+    if result is not None:
+        return result
+    
+    cached = db_manager.redis_client.get(cache_key)
+    if cached:
+        entry = orjson.loads(cached)
+        if "soft_expiry" in entry:
+            result = from_json(entry["value"])
+            if not _should_refresh_early(entry) or not _acquire_refresh_lock(cache_key):
+                _l1_set(cache_key, result)
+                return result
+    
+    start = time.monotonic()
+    result = compute()
+    _store_location_result(location, cache_key, ttl, result, to_json, time.monotonic() - start)
+    return result
+
+def _store_location_result(
+    location: Location,
+    cache_key: str,
+    ttl: int,
+    result: Any,
+    to_json: Callable[[Any], Any],
+    delta: float = 0.0
+):
+    """Write a computed location result to Redis (in the _cached_location_query entry format) and L1"""
+    entry = {
+        "value": to_json(result),
+        "soft_expiry": time.time() + ttl,
+        "delta": delta
+    }
+    _cache_location_result(location, cache_key, ttl, orjson.dumps(entry))
+    _l1_set(cache_key, result)
+
+def _clear_l1_location(location: Location):
+    """Drop this process's in-memory results for a location"""
+    prefixes = (
+        f"centers:{location.county}:{location.subcounty}:{location.ward}:",
+        f"top_centers:{location.county}:{location.subcounty}:{location.ward}:"
+    )
+    with _l1_lock:
+        for key in [key for key in _l1_cache if key.startswith(prefixes)]:
+            del _l1_cache[key]
 
 def _clear_location_cache( location: Location):
     """Clear cache for a specific location"""
-    pattern = f"centers:{location.county}:{location.subcounty}:{location.ward}:*"
-    top_pattern = f"top_centers:{location.county}:{location.subcounty}:{location.ward}:*"
+    _clear_l1_location(location)
     
-    for key in db_manager.redis_client.scan_iter(match=pattern):
-        db_manager.redis_client.delete(key)
-    
-    for key in db_manager.redis_client.scan_iter(match=top_pattern):
-        db_manager.redis_client.delete(key)
+    # Only the keys tagged for this ward, no keyspace scan; UNLINK frees them off Redis's main thread.
+    # The script also publishes the location so other processes clear their L1 copies.
+    clear_tagged_keys_script(
+        keys=[_location_tag_key(location)],
+        args=[LOCATION_INVALIDATION_CHANNEL, orjson.dumps(location.to_dict())]
+    )
+
+def _handle_location_invalidation(message: Dict[str, Any]):
+    """Pub/sub handler: clear the L1 entries for the announced location"""
+    _clear_l1_location(Location.from_dict(orjson.loads(message["data"])))
+
+def start_cache_invalidation_listener():
+    """
+    Subscribe this process to location cache invalidations from all app instances.
+    Returns the background listener thread (stop() it on shutdown).
+    """
+    pubsub = db_manager.redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{LOCATION_INVALIDATION_CHANNEL: _handle_location_invalidation})
+    return pubsub.run_in_thread(sleep_time=1.0, daemon=True)
 
 def _update_center_rating(
-     
     center_id: str, 
     rating_change: float, 
     is_new_rating: bool
-):
-    """Update center's aggregated rating"""
-    if is_new_rating:
-        # New rating
-        db_manager.centers_collection.update_one(
-            {"center_id": center_id},
+) -> Optional[Location]:
+    """
+    Update center's aggregated rating (counts, score and average in one atomic update)
+    Returns the center's location (None if there is no active center with that ID)
+    """
+    center = db_manager.centers_collection.find_one_and_update(
+        {"center_id": center_id, "active": True},
+        [
             {
-                "$inc": {
-                    "rating.total_ratings": 1,
-                    "rating.total_score": rating_change
+                "$set": {
+                    "rating.total_ratings": {"$add": ["$rating.total_ratings", 1 if is_new_rating else 0]},
+                    "rating.total_score": {"$add": ["$rating.total_score", rating_change]}
                 }
-            }
-        )
-    else:
-        # Updated rating
-        db_manager.centers_collection.update_one(
-            {"center_id": center_id},
+            },
+            # Recalculate average from the values set above
             {
-                "$inc": {
-                    "rating.total_score": rating_change
+                "$set": {
+                    "rating.average_rating": {
+                        "$round": [
+                            {"$divide": ["$rating.total_score", {"$max": ["$rating.total_ratings", 1]}]},
+                            2
+                        ]
+                    }
                 }
             }
-        )
+        ],
+        projection={"location": 1, "_id": 0}
+    )
+    return Location.from_dict(center["location"]) if center else None
+
+def _ward_counter_id(location: Location) -> str:
+    return f"{location.county}:{location.subcounty}:{location.ward}"
+
+
+def _reserve_ward_slot(location: Location) -> bool:
+    """
+    Atomically take one of the ward's MAX_CENTERS_PER_WARD slots.
+    The $inc only matches while the count is below the limit; at the limit the upsert
+    collides with the existing counter document instead, so concurrent registrations
+    can't both see 4 and push the ward to 6.
+    Returns False if the ward is full.
+    """
+    counters = db_manager.ward_counts_collection
+    counter_id = _ward_counter_id(location)
+    if counters.find_one({"_id": counter_id}, {"_id": 1}) is None:
+        # Ward registered before counters existed (or never): seed it from its active centers
+        active_centers = db_manager.centers_collection.count_documents({
+            "location.county": location.county,
+            "location.subcounty": location.subcounty,
+            "location.ward": location.ward,
+            "active": True
+        }, limit=MAX_CENTERS_PER_WARD)
+        try:
+            counters.update_one({"_id": counter_id}, {"$setOnInsert": {"count": active_centers}}, upsert=True)
+        except DuplicateKeyError:
+            pass  # Another registration seeded it first
     
-    # Recalculate average
-    center = db_manager.centers_collection.find_one({"center_id": center_id})
-    if center and center["rating"]["total_ratings"] > 0:
-        new_average = center["rating"]["total_score"] / center["rating"]["total_ratings"]
-        db_manager.centers_collection.update_one(
-            {"center_id": center_id},
-            {"$set": {"rating.average_rating": round(new_average, 2)}}
+    try:
+        counters.update_one(
+            {"_id": counter_id, "count": {"$lt": MAX_CENTERS_PER_WARD}},
+            {"$inc": {"count": 1}},
+            upsert=True
         )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def _release_ward_slot(location: Location):
+    """Give back a slot taken by _reserve_ward_slot (center deleted or registration failed)"""
+    db_manager.ward_counts_collection.update_one(
+        {"_id": _ward_counter_id(location), "count": {"$gt": 0}},
+        {"$inc": {"count": -1}}
+    )
+
 
 def format_center_for_ussd(center: AgroCenter, include_rating: bool = True) -> str:
     """Format center info for USSD display (character limit friendly)"""
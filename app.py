@@ -1,17 +1,36 @@
 from dotenv import load_dotenv
 import os
+import logging
+from contextlib import asynccontextmanager
 import africastalking
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
 
+# Load .env before the project modules, which read their settings at import
+load_dotenv()
+
 from models.models import SessionConfig
-from agent.ai_agent import process_sms_message
+from agent.ai_agent import process_sms_message_async
 from SMS.sms import send_message
+from agri_centers.utils import start_cache_invalidation_listener
+from agri_centers.agri_center_operations import warm_top_rated_cache
 
-app = FastAPI()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep this worker's in-memory center cache in step with writes made by other workers
+    listener = start_cache_invalidation_listener()
+    # Pre-compute top-rated centers so the first requests after a deploy hit the cache
+    logger.info("Warmed top-rated centers for %d wards", warm_top_rated_cache())
+    yield
+    listener.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 africastalking.initialize(
     username="sandbox",
@@ -28,25 +47,27 @@ config = SessionConfig(
 
 
 @app.post("/receive-sms")
-async def sms_callback(request: Request):
+async def sms_callback(request: Request, background_tasks: BackgroundTasks):
     """
     Endpoint to receive SMS callbacks from Africa's Talking.
     """
     content_type = request.headers.get("content-type")
-    print("Content-Type:", content_type)
+    logger.debug("Content-Type: %s", content_type)
 
     if "application/x-www-form-urlencoded" in content_type:
         form_data = await request.form()
         payload = dict(form_data)
         user_phone = payload.get("from")
         user_message = payload.get("text", "")
-        response = process_sms_message(user_phone, user_message, config)
-        send_message(
+        response = await process_sms_message_async(user_phone, user_message, config)
+        # Reply after the callback has been acknowledged; FastAPI runs this sync send in its threadpool
+        background_tasks.add_task(
+            send_message,
             recipients=[user_phone],
             message=response
         )
     else:
         payload = {"error": "Unsupported content type"}
 
-    print("Received callback:", payload)
+    logger.debug("Received callback: %s", payload)
     return {"status": "received"}
@@ -1,6 +1,66 @@
+import logging
+
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 import redis
 
+logger = logging.getLogger(__name__)
+
+# Fields read by AgroCenter.from_dict / FarmerLocation.from_dict; pass these to find()
+# so Mongo doesn't ship _id or anything else the models never look at
+CENTER_PROJECTION = {
+    "_id": 0,
+    "center_id": 1,
+    "name": 1,
+    "contact_number": 1,
+    "registrar_number": 1,
+    "location": 1,
+    "description": 1,
+    "availability": 1,
+    "rating": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "active": 1
+}
+
+FARMER_LOCATION_PROJECTION = {
+    "_id": 0,
+    "registration_id": 1,
+    "farmer_phone": 1,
+    "farmer_name": 1,
+    "location": 1,
+    "farm_description": 1,
+    "created_at": 1,
+    "active": 1
+}
+
+# Farmer location index; named so count queries can hint it
+FARMER_LOCATION_INDEX = [
+    ("location.county", 1),
+    ("location.subcounty", 1),
+    ("location.ward", 1)
+]
+FARMER_LOCATION_INDEX_NAME = "farmers_location_active"
+
+# Auto-generated names of the older non-partial indexes that the ones below replace;
+# they are dropped on startup so writes stop maintaining them
+LEGACY_CENTER_INDEX_NAMES = (
+    "location.county_1_location.subcounty_1_location.ward_1",
+    "registrar_number_1",
+    "active_1",
+    "rating.average_rating_-1"
+)
+LEGACY_FARMER_INDEX_NAMES = (
+    "location.county_1_location.subcounty_1_location.ward_1",
+    "farmer_phone_1",
+    "active_1"
+)
+
+# Every lookup filters on active: True, so indexes only hold active documents;
+# soft-deleted centers/farmers drop out of the index instead of bloating it.
+# Queries (and update filters) must include active: True for these to be used.
+ACTIVE_ONLY = {"active": True}
+
 class DatabaseManager:
     def __init__(self, mongo_uri: str, redis_host: str = 'localhost', redis_port: int = 6379):
         self.mongo_client = MongoClient(mongo_uri)
@@ -9,6 +69,8 @@ class DatabaseManager:
         self.ratings_collection = self.db.ratings
         self.farmers_collection = self.db.farmers
         self.users_collection = self.db.users
+        # One document per ward holding its active center count (see agri_centers.utils._reserve_ward_slot)
+        self.ward_counts_collection = self.db.ward_center_counts
         
         self.redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
         self.cache_ttl = 3600  # 1 hour
@@ -16,25 +78,77 @@ class DatabaseManager:
         # Create indexes
         self._create_indexes()
     
+    @staticmethod
+    def _drop_legacy_indexes(collection, names):
+        """Drop whichever of the given indexes still exist on the collection"""
+        existing = collection.index_information()
+        for name in names:
+            if name in existing:
+                collection.drop_index(name)
+    
+    @staticmethod
+    def _create_unique_index(collection, keys, **kwargs):
+        """
+        Create a unique index, logging instead of raising when existing duplicates block it.
+        Older code inserted after a separate existence check, so concurrent requests may
+        have left duplicates behind; startup shouldn't fail on them.
+        """
+        try:
+            collection.create_index(keys, unique=True, **kwargs)
+        except DuplicateKeyError as e:
+            logger.error("Unique index %s on %s not built; remove the duplicate documents first: %s",
+                         keys, collection.name, e)
+    
     def _create_indexes(self):
         """Create database indexes for optimal performance"""
+        # Mongo rejects a second index on the same keys with different options, so the older
+        # non-partial indexes go before their partial replacements are created
+        self._drop_legacy_indexes(self.centers_collection, LEGACY_CENTER_INDEX_NAMES)
+        self._drop_legacy_indexes(self.farmers_collection, LEGACY_FARMER_INDEX_NAMES)
+        
+        # Indexes follow the query shapes: equality fields first, then the sort fields
         # Agro centers indexes
+        self.centers_collection.create_index([
+            ("registrar_number", 1),
+            ("created_at", -1)
+        ], partialFilterExpression=ACTIVE_ONLY)
+        # One active center per center_id (register_agro_center relies on this for duplicates)
+        self.centers_collection.create_index(
+            "center_id", unique=True, partialFilterExpression=ACTIVE_ONLY
+        )
+        # Keyset pagination in get_centers_by_location (filter, sort field, center_id tie-breaker)
+        # These also serve plain location lookups through their (county, subcounty, ward) prefix
+        for sort_field in ("rating.average_rating", "created_at"):
+            self.centers_collection.create_index([
+                ("location.county", 1),
+                ("location.subcounty", 1),
+                ("location.ward", 1),
+                (sort_field, -1),
+                ("center_id", 1)
+            ], partialFilterExpression=ACTIVE_ONLY)
+        # get_top_rated_centers / farmer recommendations
         self.centers_collection.create_index([
             ("location.county", 1),
             ("location.subcounty", 1),
-            ("location.ward", 1)
-        ])
-        self.centers_collection.create_index("registrar_number")
-        self.centers_collection.create_index("active")
-        self.centers_collection.create_index([("rating.average_rating", -1)])
+            ("location.ward", 1),
+            ("rating.average_rating", -1),
+            ("rating.total_ratings", -1)
+        ], partialFilterExpression=ACTIVE_ONLY)
+        
+        # Ratings indexes (one rating per rater per center)
+        self._create_unique_index(self.ratings_collection, [("center_id", 1), ("rater_phone", 1)])
         
         # Farmer locations indexes
-        self.farmers_collection.create_index("farmer_phone")
         self.farmers_collection.create_index([
-            ("location.county", 1),
-            ("location.subcounty", 1),
-            ("location.ward", 1)
-        ])
-        self.farmers_collection.create_index("active")
+            ("farmer_phone", 1),
+            ("created_at", -1)
+        ], partialFilterExpression=ACTIVE_ONLY)
+        self.farmers_collection.create_index("registration_id", partialFilterExpression=ACTIVE_ONLY)
+        self.farmers_collection.create_index(
+            FARMER_LOCATION_INDEX, name=FARMER_LOCATION_INDEX_NAME, partialFilterExpression=ACTIVE_ONLY
+        )
+        
+        # Users indexes (one user per phone number; register_user relies on this for duplicates)
+        self._create_unique_index(self.users_collection, "phone_number")
 
 db_manager = DatabaseManager("mongodb://localhost:27017/")
\ No newline at end of file
@@ -4,15 +4,15 @@
 
 from typing import List, Dict
 from datetime import datetime
-import json
+import orjson
 from langchain_core.tools import tool
 
-from db.db_manager import db_manager
+from db.db_manager import db_manager, CENTER_PROJECTION, FARMER_LOCATION_PROJECTION, FARMER_LOCATION_INDEX_NAME
 from models.models import Location, FarmerLocation, AgroCenter
 from models.models import RegistrationResponse
 
 from .utils import generate_farmer_registration_id, _clear_farmer_cache
-from agri_centers.agri_center_operations import get_top_rated_centers
+from .utils import _farmer_count_key, _clear_farmer_count_cache
 
 
 def register_farmer_location(
@@ -37,7 +37,7 @@ def register_farmer_location(
         existing = db_manager.farmers_collection.find_one({
             "registration_id": registration_id,
             "active": True
-        })
+        }, {"_id": 1})
         
         if existing:
             return RegistrationResponse(
@@ -58,8 +58,9 @@ def register_farmer_location(
         # Save to database
         db_manager.farmers_collection.insert_one(farmer_location.to_dict())
         
-        # Clear farmer's location cache
+        # Clear farmer's location cache and the ward's farmer count
         _clear_farmer_cache(farmer_phone)
+        _clear_farmer_count_cache(location)
         
         return RegistrationResponse(
             success=True,
@@ -84,14 +85,14 @@ def get_farmer_locations(
     # Try cache first
     cached = db_manager.redis_client.get(cache_key)
     if cached:
-        data = json.loads(cached)
+        data = orjson.loads(cached)
         return [FarmerLocation.from_dict(loc) for loc in data]
     
     # Query database
     locations_data = db_manager.farmers_collection.find({
         "farmer_phone": farmer_phone,
         "active": True
-    }).sort("created_at", -1)
+    }, FARMER_LOCATION_PROJECTION).sort("created_at", -1)
     
     locations = [FarmerLocation.from_dict(data) for data in locations_data]
     
@@ -99,7 +100,7 @@ def get_farmer_locations(
     db_manager.redis_client.setex(
         cache_key,
         1800,
-        json.dumps([loc.to_dict() for loc in locations])
+        orjson.dumps([loc.to_dict() for loc in locations])
     )
     
     return locations
@@ -116,7 +117,7 @@ def delete_farmer_location(
             "registration_id": registration_id,
             "farmer_phone": farmer_phone,
             "active": True
-        })
+        }, {"location": 1})
         
         if not farmer_location:
             return RegistrationResponse(
@@ -127,7 +128,7 @@ def delete_farmer_location(
         
         # Soft delete
         db_manager.farmers_collection.update_one(
-            {"registration_id": registration_id},
+            {"registration_id": registration_id, "active": True},
             {
                 "$set": {
                     "active": False,
@@ -136,10 +137,11 @@ def delete_farmer_location(
             }
         )
         
-        # Clear farmer's cache
-        _clear_farmer_cache(farmer_phone)
-        
         location = Location.from_dict(farmer_location["location"])
+        
+        # Clear farmer's cache and the ward's farmer count
+        _clear_farmer_cache(farmer_phone)
+        _clear_farmer_count_cache(location)
         return RegistrationResponse(
             success=True,
             message=f"Successfully removed registration from {location.ward}, {location.subcounty}.",
@@ -161,12 +163,23 @@ def get_farmers_in_location(
 ) -> int:
     """Get count of farmers registered in a specific location"""
     location = Location(county=county, subcounty=subcounty, ward=ward)
+    cache_key = _farmer_count_key(location)
+    
+    # Try cache first
+    cached = db_manager.redis_client.get(cache_key)
+    if cached is not None:
+        return int(cached)
+    
+    # Counted off the location index alone
     count = db_manager.farmers_collection.count_documents({
         "location.county": location.county,
         "location.subcounty": location.subcounty,
         "location.ward": location.ward,
         "active": True
-    })
+    }, hint=FARMER_LOCATION_INDEX_NAME)
+    
+    # Cache for 5 minutes
+    db_manager.redis_client.setex(cache_key, 300, count)
     
     return count
 
@@ -176,19 +189,50 @@ def get_farmer_recommended_centers(
     limit: int = 3
 ) -> Dict[str, List[AgroCenter]]:
     """Get recommended agro centers based on farmer's registered locations"""
-    farmer_locations = get_farmer_locations(db_manager, farmer_phone)
+    farmer_locations = get_farmer_locations(farmer_phone)
     
     if not farmer_locations:
         return {}
     
+    # One aggregation for all of the farmer's wards instead of a query per ward
+    pipeline = [
+        {"$match": {"$or": [
+            {
+                "location.county": farmer_location.location.county,
+                "location.subcounty": farmer_location.location.subcounty,
+                "location.ward": farmer_location.location.ward,
+                "active": True,
+                "rating.total_ratings": {"$gt": 0}  # Only centers with ratings
+            }
+            for farmer_location in farmer_locations
+        ]}},
+        {"$project": CENTER_PROJECTION},
+        {"$sort": {"rating.average_rating": -1, "rating.total_ratings": -1}},
+        {"$group": {
+            "_id": {
+                "county": "$location.county",
+                "subcounty": "$location.subcounty",
+                "ward": "$location.ward"
+            },
+            "centers": {"$push": "$$ROOT"}
+        }},
+        {"$project": {"centers": {"$slice": ["$centers", limit]}}}
+    ]
+    
+    centers_by_location = {
+        (group["_id"]["county"], group["_id"]["subcounty"], group["_id"]["ward"]): group["centers"]
+        for group in db_manager.centers_collection.aggregate(pipeline)
+    }
+    
     recommendations = {}
     
     for farmer_location in farmer_locations:
-        location_key = f"{farmer_location.location.ward}, {farmer_location.location.subcounty}"
-        top_centers = get_top_rated_centers(db_manager, farmer_location.location, limit)
+        location = farmer_location.location
+        top_centers = centers_by_location.get((location.county, location.subcounty, location.ward))
         
         if top_centers:
-            recommendations[location_key] = top_centers
+            location_key = f"{location.ward}, {location.subcounty}"
+            recommendations[location_key] = [AgroCenter.from_dict(data) for data in top_centers]
     
     return recommendations
 
@@ -206,6 +250,6 @@ def is_farmer_registered_in_ward(
     existing = db_manager.farmers_collection.find_one({
         "registration_id": registration_id,
         "active": True
-    })
+    }, {"_id": 1})
     
     return existing is not None
@@ -4,22 +4,33 @@
 
 
 import hashlib
+from functools import lru_cache
 from models.models import Location
 
 from db.db_manager import db_manager
 from models.models import Location, FarmerLocation
 
 
+@lru_cache(maxsize=4096)
 def generate_farmer_registration_id(farmer_phone: str, location: Location) -> str:
     """Generate unique farmer registration ID"""
     data = f"{farmer_phone}_{location.county}_{location.subcounty}_{location.ward}"
-    return hashlib.md5(data.encode()).hexdigest()[:12]
+    # MD5 only derives a stable ID here; existing records are looked up by it, so keep the algorithm
+    return hashlib.md5(data.encode(), usedforsecurity=False).hexdigest()[:12]
 
 def _clear_farmer_cache(farmer_phone: str):
     """Clear cache for a specific farmer"""
     cache_key = f"farmer_locations:{farmer_phone}"
     db_manager.redis_client.delete(cache_key)
 
+def _farmer_count_key(location: Location) -> str:
+    """Redis key for the cached number of farmers in a ward"""
+    return f"farmer_count:{location.county}:{location.subcounty}:{location.ward}"
+
+def _clear_farmer_count_cache(location: Location):
+    """Clear the cached farmer count for a ward"""
+    db_manager.redis_client.delete(_farmer_count_key(location))
+
 def format_farmer_welcome_message(farmer_location: FarmerLocation) -> str:
     """Format welcome message for a farmer after registration"""
     return f"""Welcome {farmer_location.farmer_name}!"""
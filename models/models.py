@@ -2,13 +2,15 @@
 # DATA MODELS
 # ================================
 
+import sys
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 from enum import Enum
 from datetime import datetime, time
+from time import time as unix_time
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Location:
     county: str
     subcounty: str
@@ -23,13 +25,14 @@ class Location:
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Location':
+        # Interned: the same few county/subcounty/ward names repeat across every loaded record
         return cls(
-            county=data["county"],
-            subcounty=data["subcounty"],
-            ward=data["ward"]
+            county=sys.intern(data["county"]),
+            subcounty=sys.intern(data["subcounty"]),
+            ward=sys.intern(data["ward"])
         )
 
-@dataclass
+@dataclass(slots=True)
 class FarmerLocation:
     registration_id: str
     farmer_phone: str
@@ -61,7 +64,7 @@ class FarmerLocation:
             active=data.get("active", True)
         )
 
-@dataclass
+@dataclass(slots=True)
 class User:
     phone_number: str
     name: str = ""
@@ -98,29 +101,59 @@ class DayOfWeek(Enum):
     SATURDAY = "Saturday"
     SUNDAY = "Sunday"
 
-@dataclass
+# Plain dict lookup instead of going through Enum.__call__ for every day
+_DAY_BY_VALUE = {day.value: day for day in DayOfWeek}
+
+def _parse_hh_mm(value: str) -> time:
+    """Parse "HH:MM" without building a throwaway datetime (as strptime does)"""
+    hour, minute = value.split(":")
+    return time(int(hour), int(minute))
+
+# Bit per day for Availability.days_mask (Monday = bit 0 ... Sunday = bit 6, matching datetime.weekday())
+_DAY_BIT = {day: 1 << i for i, day in enumerate(DayOfWeek)}
+
+def _days_to_mask(days: List[DayOfWeek]) -> int:
+    mask = 0
+    for day in days:
+        mask |= _DAY_BIT[day]
+    return mask
+
+@dataclass(slots=True)
 class Availability:
     days: List[DayOfWeek]
     start_time: time
     end_time: time
+    days_mask: int = field(init=False, repr=False, compare=False)  # Derived from days at construction
+    
+    def __post_init__(self):
+        self.days_mask = _days_to_mask(self.days)
+    
+    def is_open_on(self, weekday: int) -> bool:
+        """Whether the center opens on a weekday (0 = Monday, as datetime.weekday())"""
+        return bool(self.days_mask & (1 << weekday))
     
     def to_dict(self) -> Dict[str, Any]:
         return {
-            "days": [day.value for day in self.days],
-            "start_time": self.start_time.strftime("%H:%M"),
-            "end_time": self.end_time.strftime("%H:%M")
+            "days_mask": self.days_mask,
+            "start_time": self.start_time.isoformat(timespec="minutes"),
+            "end_time": self.end_time.isoformat(timespec="minutes")
         }
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Availability':
+        if "days_mask" in data:
+            days = [day for day, bit in _DAY_BIT.items() if data["days_mask"] & bit]
+        else:
+            # Older records store the day names
+            days = [_DAY_BY_VALUE.get(day) or DayOfWeek(day) for day in data["days"]]  # DayOfWeek() raises for unknown days
         return cls(
-            days=[DayOfWeek(day) for day in data["days"]],
-            start_time=datetime.strptime(data["start_time"], "%H:%M").time(),
-            end_time=datetime.strptime(data["end_time"], "%H:%M").time()
+            days=days,
+            start_time=_parse_hh_mm(data["start_time"]),
+            end_time=_parse_hh_mm(data["end_time"])
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Rating:
     total_ratings: int = 0
     total_score: float = 0.0
@@ -141,7 +174,7 @@ class Rating:
             average_rating=data.get("average_rating", 0.0)
         )
 
-@dataclass
+@dataclass(slots=True)
 class AgroCenter:
     center_id: str
     name: str
@@ -170,6 +203,16 @@ class AgroCenter:
             "active": self.active
         }
     
+    def to_summary_dict(self) -> Dict[str, Any]:
+        """Lean form for list views: just enough to identify, contact and rank a center"""
+        return {
+            "center_id": self.center_id,
+            "name": self.name,
+            "contact_number": self.contact_number,
+            "location": self.location.to_dict(),
+            "average_rating": self.rating.average_rating
+        }
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'AgroCenter':
         return cls(
@@ -186,30 +229,36 @@ class AgroCenter:
             active=data.get("active", True)
         )
 
-@dataclass
+@dataclass(slots=True)
 class UserSession:
     phone_number: str
     current_step: str
     data: Dict[str, Any] = field(default_factory=dict)
     pagination_offset: int = 0
-    last_activity: datetime = field(default_factory=datetime.now)
+    last_activity: float = field(default_factory=unix_time)  # Epoch seconds; convert with datetime.fromtimestamp for display
 
-@dataclass
+@dataclass(slots=True)
 class RegistrationResponse:
     success: bool
     message: str
     center_id: Optional[str] = None
     errors: List[str] = field(default_factory=list)
 
-@dataclass
+@dataclass(slots=True)
 class SearchResponse:
     centers: List[AgroCenter]
-    total_count: int
     has_more: bool
-    next_offset: int
+    next_cursor: Optional[str] = None  # Pass back to get the next page
+    
+    def to_summary_dict(self) -> Dict[str, Any]:
+        return {
+            "centers": [center.to_summary_dict() for center in self.centers],
+            "has_more": self.has_more,
+            "next_cursor": self.next_cursor
+        }
 
 # Configuration
-@dataclass
+@dataclass(slots=True)
 class SessionConfig:
     max_messages_per_session: int = 10
     session_duration_hours: int = 1
@@ -1,15 +1,37 @@
 import os
-import json
-from typing import List, Dict, Any, Optional, Union
+import difflib
+import unicodedata
+import orjson
+from typing import List, Dict, Any, Optional, Sequence, Union
 import math
-from langchain_core.tools import tool
-from dotenv import load_dotenv
-load_dotenv()
+import numpy as np
+from functools import lru_cache
+from itertools import chain
 
+# Set in the environment (or .env, loaded by the app entry points before importing this module)
 KENYA_WARDS_FILE = os.getenv("KENYA_WARDS_FILE", "assets/kenya_wards.json")
 
 
-def get_counties(paginate: bool = False, page: int = 1, page_size: int = 10) -> Union[List[str], Dict[str, Any]]:
+def _paginate(items: Sequence[str], page: int, page_size: int) -> Dict[str, Any]:
+    """Slice one page out of a name list and describe the pagination state"""
+    total_items = len(items)
+    total_pages = (total_items + page_size - 1) // page_size
+    start_idx = (page - 1) * page_size
+    
+    return {
+        "data": list(items[start_idx:start_idx + page_size]),
+        "pagination": {
+            "current_page": page,
+            "page_size": page_size,
+            "total_items": total_items,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_previous": page > 1
+        }
+    }
+
+
+def get_counties(paginate: bool = False, page: int = 1, page_size: int = 10) -> Union[Sequence[str], Dict[str, Any]]:
     """
     Extract county names from the JSON data.
     Should also be used to find if a specific county exists.
@@ -21,34 +43,17 @@ def get_counties(paginate: bool = False, page: int = 1, page_size: int = 10) ->
         page_size: Number of items per page (default: 10)
     
     Returns:
-        List of county names or paginated result dictionary
+        Tuple of county names (shared, read-only) or paginated result dictionary
     """
-    data = load_json_file(KENYA_WARDS_FILE)
-    counties = list(data.keys())
+    counties = _region_index()["counties"]
     
     if not paginate:
         return counties
     
-    # Pagination logic
-    total_items = len(counties)
-    total_pages = math.ceil(total_items / page_size)
-    start_idx = (page - 1) * page_size
-    end_idx = start_idx + page_size
-    
-    return {
-        "data": counties[start_idx:end_idx],
-        "pagination": {
-            "current_page": page,
-            "page_size": page_size,
-            "total_items": total_items,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_previous": page > 1
-        }
-    }
+    return _paginate(counties, page, page_size)
 
 
-def get_subcounties(county: Optional[str] = None, paginate: bool = False, page: int = 1, page_size: int = 10) -> Union[List[str], Dict[str, Any]]:
+def get_subcounties(county: Optional[str] = None, paginate: bool = False, page: int = 1, page_size: int = 10) -> Union[Sequence[str], Dict[str, Any]]:
     """
     Extract subcounty names from the JSON data.
     To be used to find if a specific subcounty exists within a county so it's necessary to pass the county name.
@@ -61,44 +66,27 @@ def get_subcounties(county: Optional[str] = None, paginate: bool = False, page:
         page_size: Number of items per page (default: 10)
     
     Returns:
-        List of subcounty names or paginated result dictionary
+        Tuple of subcounty names (shared, read-only) or paginated result dictionary
     """
-    subcounties = []
-    data = load_json_file(KENYA_WARDS_FILE)
+    index = _region_index()
     
     if county:
-        if county in data:
-            subcounties = list(data[county].keys())
+        county = _resolve_county(county)
+        if county in index["subcounties_by_county"]:
+            subcounties = index["subcounties_by_county"][county]
         else:
             raise ValueError(f"County '{county}' not found in data")
     else:
         # Get all subcounties from all counties
-        for county_data in data.values():
-            subcounties.extend(list(county_data.keys()))
+        subcounties = index["all_subcounties"]
     
     if not paginate:
         return subcounties
     
-    # Pagination logic
-    total_items = len(subcounties)
-    total_pages = math.ceil(total_items / page_size)
-    start_idx = (page - 1) * page_size
-    end_idx = start_idx + page_size
-    
-    return {
-        "data": subcounties[start_idx:end_idx],
-        "pagination": {
-            "current_page": page,
-            "page_size": page_size,
-            "total_items": total_items,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_previous": page > 1
-        }
-    }
+    return _paginate(subcounties, page, page_size)
 
 
-def get_wards(county: Optional[str] = None, subcounty: Optional[str] = None, paginate: bool = False, page: int = 1, page_size: int = 10) -> Union[List[str], Dict[str, Any]]:
+def get_wards(county: Optional[str] = None, subcounty: Optional[str] = None, paginate: bool = False, page: int = 1, page_size: int = 10) -> Union[Sequence[str], Dict[str, Any]]:
     """
     Used to get wards in a county in a subcounty so it's necessary to pass the county and subcounty names.
     
@@ -111,48 +99,30 @@ def get_wards(county: Optional[str] = None, subcounty: Optional[str] = None, pag
         page_size: Number of items per page (default: 10)
     
     Returns:
-        List of ward names or paginated result dictionary
+        Tuple of ward names (shared, read-only) or paginated result dictionary
     """
-    wards = []
-    data = load_json_file(KENYA_WARDS_FILE)
+    index = _region_index()
+    county = _resolve_county(county) if county else county
+    subcounty = _resolve_subcounty(county, subcounty) if county and subcounty else subcounty
     
     if county and subcounty:
-        if county in data and subcounty in data[county]:
-            wards = list(data[county][subcounty].keys())
+        if (county, subcounty) in index["wards_by_subcounty"]:
+            wards = index["wards_by_subcounty"][(county, subcounty)]
         else:
             raise ValueError(f"County '{county}' or subcounty '{subcounty}' not found in data")
     elif county:
-        if county in data:
-            for subcounty_data in data[county].values():
-                wards.extend(list(subcounty_data.keys()))
+        if county in index["wards_by_county"]:
+            wards = index["wards_by_county"][county]
         else:
             raise ValueError(f"County '{county}' not found in data")
     else:
         # Get all wards from all counties and subcounties
-        for county_data in data.values():
-            for subcounty_data in county_data.values():
-                wards.extend(list(subcounty_data.keys()))
+        wards = index["all_wards"]
     
     if not paginate:
         return wards
     
-    # Pagination logic
-    total_items = len(wards)
-    total_pages = math.ceil(total_items / page_size)
-    start_idx = (page - 1) * page_size
-    end_idx = start_idx + page_size
-    
-    return {
-        "data": wards[start_idx:end_idx],
-        "pagination": {
-            "current_page": page,
-            "page_size": page_size,
-            "total_items": total_items,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_previous": page > 1
-        }
-    }
+    return _paginate(wards, page, page_size)
 
 
 def get_ward_data(county: str, subcounty: str, ward: str) -> Dict[str, Any]:
@@ -171,17 +141,23 @@ def get_ward_data(county: str, subcounty: str, ward: str) -> Dict[str, Any]:
     Raises:
         ValueError: If county, subcounty, or ward is not found
     """
+    county = _resolve_county(county)
+    subcounty = _resolve_subcounty(county, subcounty)
+    ward = _resolve_ward(county, subcounty, ward)
     try:
-        data = load_json_file()
-        return data[county][subcounty][ward]
+        return _region_index()["ward_data"][(county, subcounty, ward)]
     except KeyError as e:
         raise ValueError(f"Path not found: {county} -> {subcounty} -> {ward}. Missing key: {e}")
 
 
 # Example usage functions
+@lru_cache(maxsize=None)
 def load_json_file(file_path: Optional[str] = KENYA_WARDS_FILE) -> Dict[str, Any]:
     """
     Load JSON data from a file.
+    The ward reference data is static, so each file is parsed once per process;
+    callers must treat the returned dictionary as read-only.
+    Call load_json_file.cache_clear() after replacing the file.
     
     Args:
         file_path: Path to the JSON file
@@ -189,8 +165,229 @@ def load_json_file(file_path: Optional[str] = KENYA_WARDS_FILE) -> Dict[str, Any
     Returns:
         Loaded JSON data as dictionary
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    with open(file_path, 'rb') as file:
+        return orjson.loads(file.read())
+
+
+@lru_cache(maxsize=None)
+def _region_index(file_path: str = KENYA_WARDS_FILE) -> Dict[str, Any]:
+    """
+    Build the county/subcounty/ward name lists once from the (static) wards file,
+    so lookups are dictionary accesses instead of walks over the whole tree.
+    Lists are stored as tuples, which the getters return as-is.
+    """
+    data = load_json_file(file_path)
+    subcounties_by_county = {}
+    wards_by_subcounty = {}
+    wards_by_county = {}
+    ward_data = {}
+    county_by_name = {}
+    subcounty_by_name = {}
+    ward_by_name = {}
+    
+    for county, county_data in data.items():
+        county_by_name.setdefault(_normalize_name(county), county)
+        subcounties_by_county[county] = tuple(county_data.keys())
+        for subcounty, subcounty_data in county_data.items():
+            wards_by_subcounty[(county, subcounty)] = tuple(subcounty_data.keys())
+            subcounty_by_name.setdefault(county, {}).setdefault(_normalize_name(subcounty), subcounty)
+            for ward, data_for_ward in subcounty_data.items():
+                ward_data[(county, subcounty, ward)] = data_for_ward
+                ward_by_name.setdefault((county, subcounty), {}).setdefault(_normalize_name(ward), ward)
+        wards_by_county[county] = tuple(chain.from_iterable(county_data.values()))
+    
+    return {
+        "counties": tuple(data.keys()),
+        "subcounties_by_county": subcounties_by_county,
+        "all_subcounties": tuple(chain.from_iterable(subcounties_by_county.values())),
+        "wards_by_subcounty": wards_by_subcounty,
+        "wards_by_county": wards_by_county,
+        "all_wards": tuple(chain.from_iterable(wards_by_county.values())),
+        "ward_data": ward_data,  # (county, subcounty, ward) -> ward data, one lookup instead of three
+        # Normalized name -> canonical name, for matching user-typed names
+        "county_by_name": county_by_name,
+        "subcounty_by_name": subcounty_by_name,
+        "ward_by_name": ward_by_name
+    }
+
+
+NAME_SUFFIXES = (" sub county", " subcounty", " constituency", " county", " ward")
+NAME_MATCH_CUTOFF = 0.85  # difflib similarity ratio needed to accept a misspelling
+
+
+def _normalize_name(name: str) -> str:
+    """Lowercase, strip accents/punctuation spacing and administrative suffixes ("Sub County", "Ward"...)"""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    name = " ".join(name.lower().replace("-", " ").split())
+    for suffix in NAME_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def _match_name(name: str, names_by_normalized: Dict[str, str]) -> str:
+    """
+    Snap a user-typed name to its canonical spelling: exact match, then normalized match,
+    then the closest normalized name above NAME_MATCH_CUTOFF.
+    Returns the input unchanged when nothing matches (callers report it as not found).
+    """
+    if name in names_by_normalized.values():
+        return name
+    normalized = _normalize_name(name)
+    if normalized in names_by_normalized:
+        return names_by_normalized[normalized]
+    close = difflib.get_close_matches(normalized, names_by_normalized.keys(), n=1, cutoff=NAME_MATCH_CUTOFF)
+    return names_by_normalized[close[0]] if close else name
+
+
+@lru_cache(maxsize=1024)
+def _resolve_county(county: str) -> str:
+    return _match_name(county, _region_index()["county_by_name"])
+
+
+@lru_cache(maxsize=1024)
+def _resolve_subcounty(county: str, subcounty: str) -> str:
+    return _match_name(subcounty, _region_index()["subcounty_by_name"].get(county, {}))
+
+
+@lru_cache(maxsize=1024)
+def _resolve_ward(county: str, subcounty: str, ward: str) -> str:
+    return _match_name(ward, _region_index()["ward_by_name"].get((county, subcounty), {}))
+
+
+# Spatial index: grid cells (in degrees) -> wards whose buffer circle overlaps the cell
+WARD_GRID_CELL_DEG = 0.1  # ~11 km at the equator
+METERS_PER_DEGREE = 111320.0
+EARTH_RADIUS_M = 6371000.0
+
+
+def _grid_cell(lat: float, lon: float) -> tuple:
+    return (math.floor(lat / WARD_GRID_CELL_DEG), math.floor(lon / WARD_GRID_CELL_DEG))
+
+
+def _distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Haversine distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+@lru_cache(maxsize=None)
+def _ward_grid(file_path: str = KENYA_WARDS_FILE) -> Dict[tuple, List[tuple]]:
+    """
+    Bucket every ward into the grid cells its buffer circle (centroid +/- buffer_radius_m) overlaps.
+    Entries are (lat, lon, buffer_radius_m, county, subcounty, ward).
+    """
+    grid = {}
+    for county, county_data in load_json_file(file_path).items():
+        for subcounty, subcounty_data in county_data.items():
+            for ward, ward_data in subcounty_data.items():
+                lon, lat = ward_data["centroid"]
+                radius = ward_data["buffer_radius_m"]
+                dlat = radius / METERS_PER_DEGREE
+                dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+                min_cell = _grid_cell(lat - dlat, lon - dlon)
+                max_cell = _grid_cell(lat + dlat, lon + dlon)
+                entry = (lat, lon, radius, county, subcounty, ward)
+                for i in range(min_cell[0], max_cell[0] + 1):
+                    for j in range(min_cell[1], max_cell[1] + 1):
+                        grid.setdefault((i, j), []).append(entry)
+    return grid
+
+
+@lru_cache(maxsize=None)
+def _ward_arrays(file_path: str = KENYA_WARDS_FILE) -> Dict[str, Any]:
+    """
+    Ward geometry as parallel NumPy arrays (row i describes ward_ids[i]) for vectorized
+    distance queries over every ward at once.
+    """
+    ward_data = _region_index(file_path)["ward_data"]
+    ward_ids = tuple(ward_data.keys())
+    centroids = np.empty((len(ward_ids), 2), dtype=np.float64)  # (lat, lon)
+    radii = np.empty(len(ward_ids), dtype=np.float64)
+    areas = np.empty(len(ward_ids), dtype=np.float64)
+    
+    for i, data in enumerate(ward_data.values()):
+        lon, lat = data["centroid"]
+        centroids[i] = (lat, lon)
+        radii[i] = data["buffer_radius_m"]
+        areas[i] = data["area_m2"]
+    
+    return {"ward_ids": ward_ids, "centroids": centroids, "radii": radii, "areas": areas}
+
+
+def _distances_to_wards_m(lat: float, lon: float) -> np.ndarray:
+    """Haversine distance in meters from a point to every ward centroid (ordered as _ward_arrays)"""
+    centroids = np.radians(_ward_arrays()["centroids"])
+    phi, lmb = math.radians(lat), math.radians(lon)
+    a = (
+        np.sin((centroids[:, 0] - phi) / 2) ** 2
+        + math.cos(phi) * np.cos(centroids[:, 0]) * np.sin((centroids[:, 1] - lmb) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def _ward_id_dict(ward_id: tuple) -> Dict[str, str]:
+    county, subcounty, ward = ward_id
+    return {"county": county, "subcounty": subcounty, "ward": ward}
+
+
+def lookup_ward_by_point(lat: float, lon: float, max_distance_m: float = 50000) -> Optional[Dict[str, str]]:
+    """
+    Find the ward a coordinate falls in.
+    Wards are approximated by circles (centroid, buffer_radius_m); the closest ward whose circle
+    contains the point wins. Points outside every circle go to the nearest ward centroid
+    within max_distance_m.
+    
+    Args:
+        lat: Latitude
+        lon: Longitude
+        max_distance_m: Furthest a ward centroid may be for the nearest-ward fallback
+    
+    Returns:
+        {"county", "subcounty", "ward"} or None if no ward is nearby
+    """
+    best = None
+    best_distance = None
+    for entry in _ward_grid().get(_grid_cell(lat, lon), []):
+        distance = _distance_m(lat, lon, entry[0], entry[1])
+        if distance <= entry[2] and (best_distance is None or distance < best_distance):
+            best, best_distance = entry, distance
+    
+    if best is not None:
+        return _ward_id_dict(best[3:])
+    
+    # Not inside any ward circle: nearest centroid across all wards in one vectorized pass
+    distances = _distances_to_wards_m(lat, lon)
+    nearest = int(np.argmin(distances))
+    if distances[nearest] > max_distance_m:
+        return None
+    return _ward_id_dict(_ward_arrays()["ward_ids"][nearest])
+
+
+def get_wards_within_radius(lat: float, lon: float, radius_m: float) -> List[Dict[str, Any]]:
+    """
+    Wards whose centroid lies within radius_m of a point, nearest first.
+    
+    Args:
+        lat: Latitude
+        lon: Longitude
+        radius_m: Search radius in meters
+    
+    Returns:
+        List of {"county", "subcounty", "ward", "distance_m"}
+    """
+    distances = _distances_to_wards_m(lat, lon)
+    ward_ids = _ward_arrays()["ward_ids"]
+    matches = np.flatnonzero(distances <= radius_m)
+    
+    return [
+        {**_ward_id_dict(ward_ids[i]), "distance_m": float(distances[i])}
+        for i in matches[np.argsort(distances[matches])]
+    ]
 
 
 # Example usage:
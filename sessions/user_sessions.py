@@ -1,6 +1,7 @@
-import json
-from datetime import datetime
-from typing import Optional
+import orjson
+from contextlib import contextmanager
+import time
+from typing import Any, Dict, Iterator, Optional
 
 from db.db_manager import db_manager
 from models.models import UserSession
@@ -9,36 +10,86 @@ from models.models import UserSession
 # SESSION MANAGEMENT
 # ================================
 
+SESSION_TTL = 3600  # 1 hour session timeout
+
+def _session_key(phone_number: str) -> str:
+    """Redis hash holding a user's session fields (only `data` is serialized)"""
+    return f"user_session:{phone_number}"
+
 def get_user_session(phone_number: str) -> Optional[UserSession]:
     """Get user session from cache"""
-    session_data = db_manager.redis_client.get(f"session:{phone_number}")
-    if session_data:
-        data = json.loads(session_data)
+    data = db_manager.redis_client.hgetall(_session_key(phone_number))
+    # A step update on an expired session leaves a partial hash; treat it as no session
+    if "data" in data:
         return UserSession(
             phone_number=data["phone_number"],
             current_step=data["current_step"],
-            data=data["data"],
-            pagination_offset=data.get("pagination_offset", 0),
-            last_activity=datetime.fromisoformat(data["last_activity"])
+            data=orjson.loads(data["data"]),
+            pagination_offset=int(data.get("pagination_offset", 0)),
+            last_activity=float(data["last_activity"])
         )
     return None
 
-def save_user_session(session: UserSession):
-    """Save user session to cache"""
-    session_data = {
+def _session_fields(session: UserSession) -> Dict[str, Any]:
+    """Hash fields for a session (everything but last_activity)"""
+    return {
         "phone_number": session.phone_number,
         "current_step": session.current_step,
-        "data": session.data,
-        "pagination_offset": session.pagination_offset,
-        "last_activity": datetime.now().isoformat()
+        "data": orjson.dumps(session.data, option=orjson.OPT_NON_STR_KEYS),
+        "pagination_offset": session.pagination_offset
+    }
+
+def save_user_session(session: UserSession):
+    """Save user session to cache"""
+    key = _session_key(session.phone_number)
+    pipe = db_manager.redis_client.pipeline(transaction=False)
+    pipe.hset(key, mapping={
+        **_session_fields(session),
+        "last_activity": time.time()
+    })
+    pipe.expire(key, SESSION_TTL)
+    pipe.execute()
+
+def touch_user_session(phone_number: str) -> bool:
+    """Extend a session's timeout without rewriting it (False if it already expired)"""
+    return bool(db_manager.redis_client.expire(_session_key(phone_number), SESSION_TTL))
+
+@contextmanager
+def user_session(phone_number: str) -> Iterator[Optional[UserSession]]:
+    """
+    Read a session once for the whole request and write it back once at the end:
+    a full save only if the handler changed it, otherwise just an EXPIRE to keep it alive.
+    
+    Usage:
+        with user_session(phone) as session:
+            if session:
+                session.current_step = "menu"
+    """
+    session = get_user_session(phone_number)
+    before = _session_fields(session) if session else None
+    yield session
+    if session is None:
+        return
+    if _session_fields(session) != before:
+        save_user_session(session)
+    else:
+        touch_user_session(phone_number)
+
+def update_session_step(phone_number: str, current_step: str, pagination_offset: Optional[int] = None):
+    """Move a session to another step without rewriting its data (single HSET + EXPIRE)"""
+    key = _session_key(phone_number)
+    fields = {
+        "current_step": current_step,
+        "last_activity": time.time()
     }
+    if pagination_offset is not None:
+        fields["pagination_offset"] = pagination_offset
     
-    db_manager.redis_client.setex(
-        f"session:{session.phone_number}",
-        3600,  # 1 hour session timeout
-        json.dumps(session_data)
-    )
+    pipe = db_manager.redis_client.pipeline(transaction=False)
+    pipe.hset(key, mapping=fields)
+    pipe.expire(key, SESSION_TTL)
+    pipe.execute()
 
 def clear_user_session(phone_number: str):
     """Clear user session"""
-    db_manager.redis_client.delete(f"session:{phone_number}")
+    db_manager.redis_client.delete(_session_key(phone_number))
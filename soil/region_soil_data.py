@@ -1,9 +1,63 @@
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+from cachetools import LRUCache, TTLCache
+import numpy as np
+import orjson
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 # import time
 from typing import Dict, List, Optional, Tuple
+from redis import RedisError
 from regions.get_region import get_ward_data
+from db.db_manager import db_manager
+from common.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Soil changes on geological timescales, so results can be kept for a week.
+# The cache is bounded by the serialized size of its entries rather than their count.
+SOIL_CACHE_TTL = 7 * 24 * 3600
+SOIL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+_soil_cache = TTLCache(
+    maxsize=SOIL_CACHE_MAX_BYTES,
+    ttl=SOIL_CACHE_TTL,
+    getsizeof=lambda value: len(orjson.dumps(value))
+)
+_soil_cache_lock = threading.Lock()
+
+# Raw SoilGrids responses are also kept in Redis so they survive restarts
+SOILGRIDS_RESPONSE_TTL = 30 * 24 * 3600
+SOILGRIDS_TIMEOUT = 30.0  # seconds
+
+# In-process copy of recent responses keyed by request URL, shared by every entry point
+_response_cache = LRUCache(maxsize=4096)
+_response_cache_lock = threading.Lock()
+
+# SoilGrids has a 250 m native resolution (~0.00225 degrees), so nearby points share a cell
+SOILGRIDS_GRID_DEG = 0.00225
+
+# ISRIC allows 5 requests per minute per IP. The token bucket enforces that rate across
+# threads; the semaphore additionally caps in-flight calls when fetching many wards.
+SOILGRIDS_CALLS_PER_MINUTE = 5
+SOILGRIDS_MAX_CONCURRENT_REQUESTS = 5
+WARD_BATCH_WORKERS = 8
+
+_soilgrids_rate_limiter = TokenBucket(rate=SOILGRIDS_CALLS_PER_MINUTE / 60, capacity=SOILGRIDS_CALLS_PER_MINUTE)
+_soilgrids_semaphore = threading.BoundedSemaphore(SOILGRIDS_MAX_CONCURRENT_REQUESTS)
+
+# Properties summarised in surface_properties
+SURFACE_PROPERTIES = ('clay', 'sand', 'silt', 'phh2o', 'soc', 'bdod')
+# Depths read for surface_properties, most preferred first
+SURFACE_DEPTH_PRIORITY = ('0-5cm', '5-15cm')
+_SURFACE_DEPTH_RANK = {depth: rank for rank, depth in enumerate(SURFACE_DEPTH_PRIORITY)}
+
+
+def _snap_to_grid(value: float) -> float:
+    """Snap a coordinate to the SoilGrids grid so nearby points share one request and cache key"""
+    return round(round(value / SOILGRIDS_GRID_DEG) * SOILGRIDS_GRID_DEG, 5)
 
 class SoilGridsAPI:
     """
@@ -14,7 +68,62 @@ class SoilGridsAPI:
     def __init__(self):
         self.base_url = "https://rest.isric.org/soilgrids/v2.0"
         self.session = requests.Session()
+        # Keep connections to rest.isric.org alive across calls and retry transient failures
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            # 429 is not retried: adapter-level retries would bypass the rate limiter
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip'})
         # self.last_request_time = 0
+    
+    def _get_json(self, endpoint: str, params: Dict) -> Dict:
+        """
+        GET a SoilGrids endpoint, serving repeated queries from memory or Redis
+        
+        Args:
+            endpoint: Path below base_url (e.g. "/properties/query")
+            params: Query parameters
+            
+        Returns:
+            Decoded JSON response
+        """
+        request = self.session.prepare_request(
+            requests.Request('GET', f"{self.base_url}{endpoint}", params=params)
+        )
+        cache_key = f"soilgrids:{request.url}"
+        
+        with _response_cache_lock:
+            data = _response_cache.get(cache_key)
+        if data is not None:
+            return data
+        
+        try:
+            cached_response = db_manager.redis_client.get(cache_key)
+            if cached_response:
+                data = orjson.loads(cached_response)
+                with _response_cache_lock:
+                    _response_cache[cache_key] = data
+                return data
+        except RedisError:
+            pass
+        
+        _soilgrids_rate_limiter.acquire()
+        with _soilgrids_semaphore:
+            response = self.session.send(request, timeout=SOILGRIDS_TIMEOUT)
+        response.raise_for_status()
+        
+        data = orjson.loads(response.content)
+        with _response_cache_lock:
+            _response_cache[cache_key] = data
+        
+        try:
+            db_manager.redis_client.setex(cache_key, SOILGRIDS_RESPONSE_TTL, response.content)
+        except RedisError:
+            pass
+        return data
         
     # def _rate_limit(self):
     #     """Ensure we don't exceed 5 requests per minute"""
@@ -51,7 +160,9 @@ class SoilGridsAPI:
         if depths is None:
             depths = ['0-5cm', '5-15cm', '15-30cm', '30-60cm']
         if values is None:
-            values = ['mean', 'uncertainty']
+            values = ['mean']
+        
+        lat, lon = _snap_to_grid(lat), _snap_to_grid(lon)
             
         # self._rate_limit()
         
@@ -65,11 +176,9 @@ class SoilGridsAPI:
         }
         
         try:
-            response = self.session.get(f"{self.base_url}/properties/query", params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching soil properties: {e}")
+            return self._get_json("/properties/query", params)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            logger.error("Error fetching soil properties: %s", e)
             return {}
     
     def get_soil_classification(self, lat: float, lon: float, 
@@ -88,6 +197,8 @@ class SoilGridsAPI:
         
         if depths is None:
             depths = ['0-200cm']
+        
+        lat, lon = _snap_to_grid(lat), _snap_to_grid(lon)
             
         # self._rate_limit()
         
@@ -98,27 +209,33 @@ class SoilGridsAPI:
         }
         
         try:
-            response = self.session.get(f"{self.base_url}/classification/query", params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching soil classification: {e}")
+            return self._get_json("/classification/query", params)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            logger.error("Error fetching soil classification: %s", e)
             return {}
     
-    def get_comprehensive_soil_data(self, lat: float, lon: float) -> Dict:
+    def get_comprehensive_soil_data(self, lat: float, lon: float,
+                                    properties: Optional[List[str]] = None,
+                                    depths: Optional[List[str]] = None) -> Dict:
         """
         Get both soil properties and classification for a location
         
         Args:
             lat: Latitude in decimal degrees
             lon: Longitude in decimal degrees
+            properties: Soil properties to retrieve (see get_soil_properties)
+            depths: Depth intervals for the properties (see get_soil_properties)
             
         Returns:
             Dictionary with both properties and classification data
         """
         
-        properties_data = self.get_soil_properties(lat, lon)
-        classification_data = self.get_soil_classification(lat, lon)
+        # The two SoilGrids endpoints are independent, so query them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            properties_future = executor.submit(self.get_soil_properties, lat, lon, properties, depths)
+            classification_future = executor.submit(self.get_soil_classification, lat, lon)
+            properties_data = properties_future.result()
+            classification_data = classification_future.result()
         
         return {
             'location': {'lat': lat, 'lon': lon},
@@ -171,8 +288,53 @@ class SoilGridsAPI:
             return "Loam"
         else:
             return "Sandy Loam"
+    
+    def interpret_soil_texture_batch(self, clay_pct: np.ndarray, sand_pct: np.ndarray,
+                                     silt_pct: np.ndarray) -> np.ndarray:
+        """
+        Vectorized interpret_soil_texture for many points at once (e.g. a whole raster)
+        
+        The conditions mirror interpret_soil_texture in order; np.select takes the first match.
+        
+        Args:
+            clay_pct: Array of clay percentages
+            sand_pct: Array of sand percentages
+            silt_pct: Array of silt percentages
+            
+        Returns:
+            Array of soil texture class names
+        """
+        clay = np.asarray(clay_pct, dtype=float)
+        sand = np.asarray(sand_pct, dtype=float)
+        silt = np.asarray(silt_pct, dtype=float)
+        
+        conditions = [
+            clay >= 40,
+            (clay >= 27) & (sand >= 45),
+            (clay >= 27) & (sand >= 20),
+            clay >= 27,
+            (clay >= 20) & (sand >= 45),
+            (clay >= 20) & (silt >= 28),
+            clay >= 20,
+            sand >= 85,
+            (sand >= 70) & (clay >= 15),
+            sand >= 70,
+            silt >= 80,
+            silt >= 50,
+            clay >= 7,
+        ]
+        choices = [
+            "Clay", "Sandy Clay", "Clay Loam", "Silty Clay",
+            "Sandy Clay Loam", "Silty Clay Loam", "Clay Loam",
+            "Sand", "Sandy Clay Loam", "Loamy Sand",
+            "Silt", "Silt Loam", "Loam",
+        ]
+        return np.select(conditions, choices, default="Sandy Loam")
+
+
+# Shared client so every lookup reuses the same pooled session
+soilgrids_api = SoilGridsAPI()
 
-@lru_cache(maxsize=1)
 def get_soil_data_for_ai_agent(county:str, subcounty:str, ward:str, detailed: bool = True) -> Dict:
     """
     AI Agent Tool: Get comprehensive soil data for a location
@@ -185,7 +347,7 @@ def get_soil_data_for_ai_agent(county:str, subcounty:str, ward:str, detailed: bo
         county: County name (e.g. "Nairobi")
         subcounty: Subcounty name (e.g. "Westlands")
         ward: Ward name (e.g. "Parklands")
-        detailed: If True, includes all depth layers. If False, focuses on surface layer (0-30cm)
+        detailed: If True, includes all depth layers. If False, only fetches the surface layers (0-15cm)
         
     Returns:
         Dictionary with structured soil data:
@@ -216,21 +378,42 @@ def get_soil_data_for_ai_agent(county:str, subcounty:str, ward:str, detailed: bo
         }
     """
 
-    ward = get_ward_data(county, subcounty, ward)
-    if not ward:
-        print
+    cache_key = (county, subcounty, ward, detailed)
+    with _soil_cache_lock:
+        result = _soil_cache.get(cache_key)
+    if result is not None:
+        return result
+    
+    result = _fetch_soil_data(county, subcounty, ward, detailed)
+    
+    # Only complete answers are kept; failures and empty SoilGrids responses are retried next time
+    if result['success'] and result['soil_type'] != 'Unknown' and any(
+        value is not None for value in result['surface_properties'].values()
+    ):
+        with _soil_cache_lock:
+            try:
+                _soil_cache[cache_key] = result
+            except ValueError:
+                pass  # Larger than the whole cache budget
+    return result
+
+
+def _fetch_soil_data(county: str, subcounty: str, ward: str, detailed: bool) -> Dict:
+    """Look up the ward and fetch and interpret its soil data (uncached body of get_soil_data_for_ai_agent)"""
+    ward_data = get_ward_data(county, subcounty, ward)
+    if not ward_data:
+        logger.warning("Ward '%s' not found in %s, %s", ward, county, subcounty)
         return {
             'success': False,
             'location': {'lat': None, 'lon': None},
             'error': f"Ward '{ward}' not found in {county}, {subcounty}"
         }
     
-    lat = ward['centroid'][0]
-    lon = ward['centroid'][1]
+    # Centroids are stored GeoJSON-style as [lon, lat]
+    lon, lat = ward_data['centroid']
     
     try:
-        # Initialize API client
-        api = SoilGridsAPI()
+        api = soilgrids_api
         
         # Get comprehensive data
         result = {
@@ -242,57 +425,56 @@ def get_soil_data_for_ai_agent(county:str, subcounty:str, ward:str, detailed: bo
             'interpretation': {}
         }
         
-        # Get soil classification
-        classification_data = api.get_soil_classification(lat, lon)
-        print(f"Classification data: {classification_data}")
-        if classification_data and 'wrb_class_name' in classification_data:
-            result['soil_type'] = classification_data['wrb_class_name']
-        
-        # Get soil properties
+        # cec and nitrogen only appear in the depth profile, so skip them otherwise
+        properties = list(SURFACE_PROPERTIES)
         if detailed:
             depths = ['0-5cm', '5-15cm', '15-30cm', '30-60cm', '60-100cm', '100-200cm']
+            properties += ['cec', 'nitrogen']
             result['depth_profile'] = {}
         else:
-            depths = ['0-5cm', '5-15cm', '15-30cm']
+            # Only the surface depths are read without a depth profile
+            depths = list(SURFACE_DEPTH_PRIORITY)
+        
+        soil_data = api.get_comprehensive_soil_data(lat, lon, properties, depths)
+        classification_data = soil_data['classification']
+        properties_data = soil_data['properties']
         
-        properties = ['clay', 'sand', 'silt', 'phh2o', 'soc', 'bdod', 'cec', 'nitrogen']
-        properties_data = api.get_soil_properties(lat, lon, properties, depths)
+        logger.debug("Classification data: %s", classification_data)
+        if classification_data and 'wrb_class_name' in classification_data:
+            result['soil_type'] = classification_data['wrb_class_name']
         
         if properties_data and 'properties' in properties_data:
             # Handle the actual API response structure
             layers_data = properties_data['properties'].get('layers', [])
             
-            # Convert layers list to a more usable dictionary format
-            props = {}
+            # Single pass over the layers: pick surface values by SURFACE_DEPTH_PRIORITY
+            # and fill the depth profile as we go
+            surface_props = {}
+            surface_ranks = {}
+            depth_profile = {depth: {} for depth in depths} if detailed else None
+            
             for layer in layers_data:
                 prop_name = layer['name']
-                props[prop_name] = {}
+                d_factor = layer.get('unit_measure', {}).get('d_factor')
+                is_surface_prop = prop_name in SURFACE_PROPERTIES
                 
                 for depth_info in layer['depths']:
-                    depth_label = depth_info['label']
-                    values = depth_info['values']
+                    mean_val = depth_info['values'].get('mean')
+                    if mean_val is None:
+                        continue
                     
                     # Apply unit conversion if needed
-                    mean_val = values.get('mean')
-                    if mean_val is not None and 'd_factor' in layer.get('unit_measure', {}):
-                        d_factor = layer['unit_measure']['d_factor']
+                    if d_factor is not None:
                         mean_val = mean_val / d_factor
                     
-                    props[prop_name][depth_label] = {
-                        'mean': mean_val,
-                        'uncertainty': values.get('uncertainty')
-                    }
-            
-            # Extract surface properties (0-5cm or average of top layers)
-            surface_props = {}
-            
-            for prop in ['clay', 'sand', 'silt', 'phh2o', 'soc', 'bdod']:
-                if prop in props:
-                    # Try to get 0-5cm first, then 5-15cm as fallback
-                    for depth in ['0-5cm', '5-15cm']:
-                        if depth in props[prop] and props[prop][depth]['mean'] is not None:
-                            surface_props[prop] = props[prop][depth]['mean']
-                            break
+                    depth_label = depth_info['label']
+                    if is_surface_prop:
+                        rank = _SURFACE_DEPTH_RANK.get(depth_label)
+                        if rank is not None and rank < surface_ranks.get(prop_name, len(SURFACE_DEPTH_PRIORITY)):
+                            surface_props[prop_name] = mean_val
+                            surface_ranks[prop_name] = rank
+                    if detailed and depth_label in depth_profile:
+                        depth_profile[depth_label][prop_name] = mean_val
             
             # Map to user-friendly names
             result['surface_properties'] = {
@@ -314,18 +496,14 @@ def get_soil_data_for_ai_agent(county:str, subcounty:str, ward:str, detailed: bo
             
             # Add detailed depth profile if requested
             if detailed:
-                for depth in depths:
-                    depth_data = {}
-                    for prop in properties:
-                        if prop in props and depth in props[prop] and props[prop][depth]['mean'] is not None:
-                            depth_data[prop] = props[prop][depth]['mean']
-                    if depth_data:
-                        result['depth_profile'][depth] = depth_data
+                result['depth_profile'] = {
+                    depth: depth_data for depth, depth_data in depth_profile.items() if depth_data
+                }
         
         # Add agricultural interpretation
         result['interpretation'] = _interpret_soil_for_agriculture(result['surface_properties'])
         
-        print(f"Final result: {result}")
+        logger.debug("Final result: %s", result)
         return result
         
     except Exception as e:
@@ -336,6 +514,29 @@ def get_soil_data_for_ai_agent(county:str, subcounty:str, ward:str, detailed: bo
         }
 
 
+def get_soil_data_for_wards(wards: List[Tuple[str, str, str]], detailed: bool = True) -> List[Dict]:
+    """
+    Get soil data for several wards at once
+    
+    Wards are fetched concurrently; SoilGrids calls still go through the shared rate limiter.
+    
+    Args:
+        wards: List of (county, subcounty, ward) tuples
+        detailed: Passed through to get_soil_data_for_ai_agent
+        
+    Returns:
+        List of soil data dictionaries in the same order as wards
+    """
+    if not wards:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(WARD_BATCH_WORKERS, len(wards))) as executor:
+        return list(executor.map(
+            lambda location: get_soil_data_for_ai_agent(*location, detailed=detailed),
+            wards
+        ))
+
+
 def _interpret_soil_for_agriculture(surface_props: Dict) -> Dict:
     """
     Interpret soil properties for agricultural suitability
@@ -430,6 +631,71 @@ def _interpret_soil_for_agriculture(surface_props: Dict) -> Dict:
     return interpretation
 
 
+def _interpret_soil_batch(ph: np.ndarray, organic_carbon: np.ndarray,
+                          clay: np.ndarray, sand: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized _interpret_soil_for_agriculture for many locations at once
+    
+    Missing values are passed as NaN and are skipped the same way None is in the scalar version.
+    
+    Args:
+        ph: Array of surface pH values
+        organic_carbon: Array of organic carbon percentages
+        clay: Array of clay percentages
+        sand: Array of sand percentages
+        
+    Returns:
+        Dictionary of arrays: ph_status and organic_matter (None where the input is missing),
+        drainage_characteristics and agricultural_suitability
+    """
+    ph = np.asarray(ph, dtype=float)
+    organic_carbon = np.asarray(organic_carbon, dtype=float)
+    clay = np.asarray(clay, dtype=float)
+    sand = np.asarray(sand, dtype=float)
+    
+    has_ph = ~np.isnan(ph)
+    has_oc = ~np.isnan(organic_carbon)
+    has_clay = ~np.isnan(clay)
+    has_texture = has_clay & ~np.isnan(sand)
+    
+    ph_status = np.select(
+        [~has_ph, ph < 5.5, ph > 8.0],
+        [None, 'Acidic - may need liming', 'Alkaline - may affect nutrient availability'],
+        default='Suitable pH range'
+    )
+    organic_matter = np.select(
+        [~has_oc, organic_carbon < 1.0, organic_carbon > 3.0],
+        [None, 'Low - needs organic inputs', 'High - good fertility potential'],
+        default='Moderate'
+    )
+    drainage = np.select(
+        [~has_texture, clay > 40, sand > 70],
+        ['Unknown', 'Poor drainage - clay-rich soil', 'Excellent drainage - may need frequent irrigation'],
+        default='Moderate drainage - good for most crops'
+    )
+    
+    # NaN comparisons are False, so missing inputs add nothing to the score
+    score = (
+        np.where((ph >= 6.0) & (ph <= 7.5), 2, np.where((ph >= 5.5) & (ph <= 8.0), 1, 0))
+        + np.where(organic_carbon > 2.0, 2, np.where(organic_carbon > 1.0, 1, 0))
+        + np.where((clay >= 20) & (clay <= 40), 2, np.where((clay >= 10) & (clay <= 50), 1, 0))
+    )
+    factors = has_ph.astype(int) + has_oc + has_clay
+    avg_score = np.divide(score, factors, out=np.zeros(score.shape), where=factors > 0)
+    suitability = np.select(
+        [factors == 0, avg_score >= 1.5, avg_score >= 1.0],
+        ['Unknown', 'Good - suitable for most crops', 'Moderate - suitable with proper management'],
+        default='Limited - may need significant amendments'
+    )
+    
+    return {
+        'ph_status': ph_status,
+        'organic_matter': organic_matter,
+        'drainage_characteristics': drainage,
+        'agricultural_suitability': suitability
+    }
+
+
 # Example usage and demonstration
 def main():
     """Example usage demonstrating both the class and the AI agent function"""
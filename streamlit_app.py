@@ -1,5 +1,5 @@
 import streamlit as st
-import time
+import html
 import random
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
@@ -18,7 +18,7 @@ st.set_page_config(
 )
 
 # Custom CSS for beautiful styling
-st.markdown("""
+PAGE_CSS = """
 <style>
     /* Import Google Fonts */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
@@ -142,7 +142,7 @@ st.markdown("""
     footer {visibility: hidden;}
     header {visibility: hidden;}
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # Initialize session state
 if 'messages' not in st.session_state:
@@ -163,12 +163,15 @@ if 'user_profile' not in st.session_state:
     }
 
 # Header
-st.markdown("""
+PAGE_HEADER = """
 <div class="header-container">
     <h1 class="header-title">🌱 AgriAid</h1>
     <p class="header-subtitle">Your Intelligent Agricultural Assistant</p>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+# Styles and header are static, so send them to the frontend as one element
+st.markdown(PAGE_CSS + PAGE_HEADER, unsafe_allow_html=True)
 
 # Sidebar
 with st.sidebar:
@@ -236,23 +239,26 @@ with st.sidebar:
 st.markdown("### 💬 Chat with AgriAid")
 
 # Display chat messages
+def render_message(message):
+    """Render one chat message as HTML, escaping its content"""
+    if message["role"] == "user":
+        css_class, speaker = "user-message", "You"
+    else:
+        css_class, speaker = "ai-message", "AgriAid"
+    return f"""
+        <div class="{css_class}">
+            <strong>{speaker}:</strong> {html.escape(str(message["content"]))}
+            <br><small style="color: #666; font-size: 0.8em;">{message["timestamp"].strftime("%H:%M")}</small>
+        </div>
+    """
+
+# The whole history goes to the frontend in a single element
 chat_container = st.container()
 with chat_container:
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(f"""
-                <div class="user-message">
-                    <strong>You:</strong> {message["content"]}
-                    <br><small style="color: #666; font-size: 0.8em;">{message["timestamp"].strftime("%H:%M")}</small>
-                </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-                <div class="ai-message">
-                    <strong>AgriAid:</strong> {message["content"]}
-                    <br><small style="color: #666; font-size: 0.8em;">{message["timestamp"].strftime("%H:%M")}</small>
-                </div>
-            """, unsafe_allow_html=True)
+    st.markdown(
+        "".join(render_message(message) for message in st.session_state.messages),
+        unsafe_allow_html=True
+    )
 
 # Chat input
 if prompt := st.chat_input("Ask AgriAid anything about farming..."):
@@ -263,10 +269,7 @@ if prompt := st.chat_input("Ask AgriAid anything about farming..."):
         "timestamp": datetime.now()
     })
     
-    # Simulate AI response (replace with actual AI integration)
     with st.spinner("AgriAid is thinking..."):
-        time.sleep(1)  # Simulate processing time
-        
         # Generate contextual response based on user input
         response = process_sms_message(user_phone, prompt)
         
@@ -278,33 +281,38 @@ if prompt := st.chat_input("Ask AgriAid anything about farming..."):
     
     st.rerun()
 
+# Response templates keyed by the keyword that triggers them; only the matching one is formatted
+AI_RESPONSE_TEMPLATES = {
+    'weather': "Based on current conditions in {location}, here's what I recommend: The temperature is favorable for your {crops}. With 68% humidity and recent rainfall, consider adjusting irrigation schedules. Would you like a detailed 7-day forecast?",
+    
+    'pest': "🐛 For pest management in {crops}, I recommend regular scouting. Common pests this season include aphids and caterpillars. Would you like me to help identify a specific pest or provide organic control methods?",
+    
+    'fertilizer': "🌿 For your {farm_size} farm growing {crops}, I suggest soil testing first. Generally, a balanced NPK ratio works well, but let me know your soil type for specific recommendations.",
+    
+    'irrigation': "💧 Based on current weather (68% humidity, recent 15mm rainfall), your irrigation needs are moderate. For {crops}, I recommend checking soil moisture levels. Would you like a custom irrigation schedule?",
+    
+    'market': "📈 Current market trends show good prices for {crops} in {location}. Premium quality crops are fetching 15-20% above average. Would you like specific pricing data or harvest timing advice?",
+    
+    'health': "🌱 For crop health assessment of your {crops}, look for: leaf discoloration, growth patterns, and pest signs. Share photos if you notice any issues, and I'll help diagnose problems.",
+}
+
+DEFAULT_AI_RESPONSE = "I'm here to help with your agricultural needs! As an expert in farming, I can assist with crop management, pest control, weather planning, and more. Your profile shows you're growing {crops} - what specific challenge are you facing today?"
+
 def generate_ai_response(user_input, profile):
     """Generate contextual AI responses based on user input"""
     
     user_input_lower = user_input.lower()
     
-    # Context-aware responses
-    responses = {
-        'weather': f"Based on current conditions in {profile['location']}, here's what I recommend: The temperature is favorable for your {', '.join(profile['primary_crops'])}. With 68% humidity and recent rainfall, consider adjusting irrigation schedules. Would you like a detailed 7-day forecast?",
-        
-        'pest': f"🐛 For pest management in {', '.join(profile['primary_crops'])}, I recommend regular scouting. Common pests this season include aphids and caterpillars. Would you like me to help identify a specific pest or provide organic control methods?",
-        
-        'fertilizer': f"🌿 For your {profile['farm_size']} farm growing {', '.join(profile['primary_crops'])}, I suggest soil testing first. Generally, a balanced NPK ratio works well, but let me know your soil type for specific recommendations.",
-        
-        'irrigation': f"💧 Based on current weather (68% humidity, recent 15mm rainfall), your irrigation needs are moderate. For {', '.join(profile['primary_crops'])}, I recommend checking soil moisture levels. Would you like a custom irrigation schedule?",
-        
-        'market': f"📈 Current market trends show good prices for {', '.join(profile['primary_crops'])} in {profile['location']}. Premium quality crops are fetching 15-20% above average. Would you like specific pricing data or harvest timing advice?",
-        
-        'health': f"🌱 For crop health assessment of your {', '.join(profile['primary_crops'])}, look for: leaf discoloration, growth patterns, and pest signs. Share photos if you notice any issues, and I'll help diagnose problems.",
-    }
-    
-    # Match user input to appropriate response
-    for keyword, response in responses.items():
-        if keyword in user_input_lower:
-            return response
-    
-    # Default helpful response
-    return f"I'm here to help with your agricultural needs! As an expert in farming, I can assist with crop management, pest control, weather planning, and more. Your profile shows you're growing {', '.join(profile['primary_crops'])} - what specific challenge are you facing today?"
+    # Match user input to appropriate response, defaulting to a general one
+    template = next(
+        (template for keyword, template in AI_RESPONSE_TEMPLATES.items() if keyword in user_input_lower),
+        DEFAULT_AI_RESPONSE
+    )
+    return template.format(
+        location=profile['location'],
+        crops=', '.join(profile['primary_crops']),
+        farm_size=profile['farm_size']
+    )
 
 # Footer with additional features
 st.markdown("---")
@@ -336,16 +344,23 @@ with col3:
     """, unsafe_allow_html=True)
 
 # Sample chart for demonstration
-if st.checkbox("Show Sample Analytics", value=False):
-    st.markdown("### 📈 Sample Farm Analytics")
-    
-    # Create sample data
+@st.cache_data
+def _sample_analytics_df():
+    """Monthly yield sample data; seeded so the cached result stays stable"""
+    rng = random.Random(42)
     dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='M')
-    crop_yield = [random.randint(80, 120) for _ in range(len(dates))]
-    
+    return pd.DataFrame({
+        'month': dates,
+        'crop_yield': [rng.randint(80, 120) for _ in range(len(dates))]
+    })
+
+@st.cache_resource
+def _sample_analytics_fig():
+    """Build the sample analytics figure once per process"""
+    df = _sample_analytics_df()
     fig = px.line(
-        x=dates, 
-        y=crop_yield,
+        x=df['month'], 
+        y=df['crop_yield'],
         title="Monthly Crop Yield Trends",
         labels={'x': 'Month', 'y': 'Yield (%)'}
     )
@@ -353,7 +368,11 @@ if st.checkbox("Show Sample Analytics", value=False):
         plot_bgcolor='rgba(0,0,0,0)',
         paper_bgcolor='rgba(0,0,0,0)',
     )
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+if st.checkbox("Show Sample Analytics", value=False):
+    st.markdown("### 📈 Sample Farm Analytics")
+    st.plotly_chart(_sample_analytics_fig(), use_container_width=True)
 
 # Clear chat button
 if st.button("🗑️ Clear Chat History", type="secondary"):
@@ -1,7 +1,13 @@
 from datetime import datetime
+import logging
+import orjson
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from db.db_manager import db_manager
 from typing import Optional, Dict, Any
 
+logger = logging.getLogger(__name__)
+
 def register_user(phone_number: str, name: str) -> Dict[str, Any]:
     """Register a new user in the database."""
     user_data = {
@@ -10,16 +16,15 @@ def register_user(phone_number: str, name: str) -> Dict[str, Any]:
         "created_at": datetime.now().isoformat()
     }
 
-    # Check if user already exists
-    existing_user = db_manager.users_collection.find_one({"phone_number": phone_number})
-    if existing_user:
-        raise ValueError(f"User with phone number {phone_number} already exists.")
-    
     try:
-        db_manager.users_collection.insert_one(user_data)
+        # The unique phone_number index rejects duplicates, so no existence check is needed.
+        # insert_one adds an ObjectId _id to the dict it is given, so pass a copy
+        db_manager.users_collection.insert_one(dict(user_data))
         # cache user data in Redis
-        db_manager.redis_client.set(f"user:{phone_number}", user_data, ex=db_manager.cache_ttl)
+        db_manager.redis_client.set(f"user:{phone_number}", orjson.dumps(user_data), ex=db_manager.cache_ttl)
         return user_data
+    except DuplicateKeyError:
+        raise ValueError(f"User with phone number {phone_number} already exists.")
     except Exception as e:
         raise RuntimeError(f"Failed to register user: {str(e)}")
 
@@ -28,32 +33,36 @@ def get_user_by_phone_number(phone_number: str) -> Optional[Dict[str, Any]]:
     This will mainly be used to check if a user is registered/exists in our database and get their name.
     Retrieves user data from the database by phone number.
     """
-    print("Has been called with phone number:", phone_number)
+    logger.debug("get_user_by_phone_number: %s", phone_number)
     # Check Redis cache first
     cached_user = db_manager.redis_client.get(f"user:{phone_number}")
     if cached_user:
-        return cached_user
+        return orjson.loads(cached_user)
     
     # If not in cache, query MongoDB
-    user_data = db_manager.users_collection.find_one({"phone_number": phone_number})
+    user_data = db_manager.users_collection.find_one({"phone_number": phone_number}, {"_id": 0})
+    if not user_data:
+        return None
     
-    if user_data:
-        user_data.pop("_id", None)  # Remove MongoDB ObjectId
-    return user_data if user_data else None
+    db_manager.redis_client.set(f"user:{phone_number}", orjson.dumps(user_data), ex=db_manager.cache_ttl)
+    return user_data
 
 def update_user_name(phone_number: str, new_name: str) -> Optional[Dict[str, Any]]:
     """Update the user's name in the database."""
-    result = db_manager.users_collection.update_one(
+    # Update and fetch the new document in one round trip
+    user_data = db_manager.users_collection.find_one_and_update(
         {"phone_number": phone_number},
-        {"$set": {"name": new_name}}
+        {"$set": {"name": new_name}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
 
-    # Clear cache after update
-    db_manager.redis_client.delete(f"user:{phone_number}")
-    
-    if result.modified_count > 0:
-        return get_user_by_phone_number(phone_number)
-    return None
+    # Refresh the cache with the updated user, or drop it if the user no longer exists
+    if user_data:
+        db_manager.redis_client.set(f"user:{phone_number}", orjson.dumps(user_data), ex=db_manager.cache_ttl)
+    else:
+        db_manager.redis_client.delete(f"user:{phone_number}")
+    return user_data
 
 def delete_user(phone_number: str) -> bool:
     """Delete a user from the database by phone number."""
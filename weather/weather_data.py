@@ -1,16 +1,25 @@
 import os
+import operator
 import requests
-import json
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Union, Tuple
-from functools import lru_cache, wraps
 import time
 import logging
-import json
-from pathlib import Path
+import threading
+from urllib.parse import urlencode
+from cachetools import TTLCache
+import numpy as np
+import orjson
+from redis import RedisError
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-from .utils import capitalize_words
+from db.db_manager import db_manager
+from regions.get_region import get_ward_data
+from common.rate_limit import TokenBucket
 
 
 load_dotenv()  # Load environment variables from .env file if available
@@ -19,71 +28,129 @@ load_dotenv()  # Load environment variables from .env file if available
 # logging.basicConfig(level=logging.INFO)
 # logger = logging.getLogger(__name__)
 
-kenyan_wards = {}
-
 # Constants
 BASE_URL = "https://api.openweathermap.org/data/3.0/onecall"
-RATE_LIMIT_DELAY = 1  # seconds between requests to avoid hitting limits
 MAX_RETRIES = 3
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
+# extract_farmer_relevant_data only reads the current and daily blocks
+FARMER_FORECAST_EXCLUDE = ["minutely", "hourly", "alerts"]
+# Upper bound on a response body; anything larger is rejected without parsing
+MAX_RESPONSE_BYTES = 5_000_000
+
+# Shared session so OpenWeather calls reuse keep-alive connections instead of a new TLS handshake each time.
+# urllib3 retries connection errors and 5xx responses with exponential backoff; once retries run out
+# the last response is returned and mapped to an error below. 429 is not retried here: that would bypass
+# _rate_limiter and sleep on an uncapped Retry-After while holding a _request_semaphore slot, so it is
+# surfaced straight away as daily_limit_exceeded.
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False
+    )
+))
+http_session.headers.update({"Accept-Encoding": "gzip"})
+
+# Forecasts change at most every ~10 minutes; past weather does not change at all.
+# Responses are cached in-process first, then in Redis so all workers share hits.
+FORECAST_CACHE_TTL = 900
+HISTORICAL_CACHE_TTL = 86400
+
+_forecast_cache = TTLCache(maxsize=512, ttl=FORECAST_CACHE_TTL)
+_historical_cache = TTLCache(maxsize=512, ttl=HISTORICAL_CACHE_TTL)
+_cache_lock = threading.Lock()
+
+# Cap in-flight OpenWeather calls when fanning out across many wards
+OPENWEATHER_MAX_CONCURRENT_REQUESTS = 8
+WEATHER_BATCH_WORKERS = 8
+
+_request_semaphore = threading.BoundedSemaphore(OPENWEATHER_MAX_CONCURRENT_REQUESTS)
+
+# OpenWeather's free tier allows 60 calls/minute; stay a little under it.
+# Calls only wait once the burst capacity is used up.
+OPENWEATHER_CALLS_PER_MINUTE = 50
+
+_rate_limiter = TokenBucket(rate=OPENWEATHER_CALLS_PER_MINUTE / 60, capacity=OPENWEATHER_CALLS_PER_MINUTE)
 
-def rate_limit(func):
-    """Decorator to add rate limiting between API calls"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        time.sleep(RATE_LIMIT_DELAY)
-        return func(*args, **kwargs)
-    return wrapper
-
-def retry_on_failure(max_retries: int = MAX_RETRIES):
-    """Decorator to retry API calls on failure"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except requests.exceptions.RequestException as e:
-                    last_exception = e
-                    if attempt < max_retries - 1:
-                        wait_time = 2 ** attempt  # Exponential backoff
-                        # logger.warning(f"API call failed (attempt {attempt + 1}), retrying in {wait_time}s: {e}")
-                        time.sleep(wait_time)
-                    else:
-                        # logger.error(f"API call failed after {max_retries} attempts: {e}")
-                        print(f"API call failed after {max_retries} attempts: {e}")
-            raise last_exception
-        return wrapper
-    return decorator
-
-@rate_limit
-@retry_on_failure()
 def make_api_request(url: str, params: Dict) -> Dict:
     """Make HTTP request to OpenWeather API with error handling"""
     try:
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 429:
-            raise requests.exceptions.HTTPError(
-                "API rate limit exceeded. Daily limit of 1,000 calls reached or custom limit hit."
-            )
-        elif response.status_code == 401:
-            raise requests.exceptions.HTTPError("Invalid API key")
-        elif response.status_code == 404:
-            raise requests.exceptions.HTTPError("Location not found")
-        elif response.status_code != 200:
-            raise requests.exceptions.HTTPError(f"API error: {response.status_code}")
+        _rate_limiter.acquire()
+        with _request_semaphore, http_session.get(url, params=params, timeout=10, stream=True) as response:
+            if response.status_code == 429:
+                raise requests.exceptions.HTTPError(
+                    "API rate limit exceeded. Daily limit of 1,000 calls reached or custom limit hit.",
+                    response=response
+                )
+            elif response.status_code == 401:
+                raise requests.exceptions.HTTPError("Invalid API key", response=response)
+            elif response.status_code == 404:
+                raise requests.exceptions.HTTPError("Location not found")
+            elif response.status_code != 200:
+                raise requests.exceptions.HTTPError(f"API error: {response.status_code}")
+            
+            # Read at most one byte past the limit so oversized payloads are rejected before parsing
+            body = response.raw.read(MAX_RESPONSE_BYTES + 1, decode_content=True)
         
-        return response.json()
+        if len(body) > MAX_RESPONSE_BYTES:
+            raise requests.exceptions.RequestException("Response too large")
+        return orjson.loads(body)
     
     except requests.exceptions.Timeout:
         raise requests.exceptions.RequestException("Request timed out")
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, urllib3.exceptions.HTTPError):
+        # Body reads go through urllib3 directly, so its errors are mapped here too
         raise requests.exceptions.RequestException("Connection error - check internet connectivity")
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         raise requests.exceptions.RequestException("Invalid response format from API")
 
+def _weather_cache_key(url: str, params: Dict) -> str:
+    """Build a cache key from the URL and sorted params, leaving out the API key"""
+    query = urlencode(sorted((k, v) for k, v in params.items() if k != "appid"))
+    return f"weather:{url}?{query}"
+
+def _cached_api_request(url: str, params: Dict, cache: TTLCache) -> Dict:
+    """
+    make_api_request with an in-process TTL cache and a shared Redis tier
+    
+    Args:
+        url: API endpoint URL
+        params: Query parameters
+        cache: In-process cache for this endpoint; its TTL is reused for Redis
+    
+    Returns:
+        Weather data dictionary
+    """
+    cache_key = _weather_cache_key(url, params)
+    
+    with _cache_lock:
+        data = cache.get(cache_key)
+    if data is not None:
+        return data
+    
+    try:
+        cached_data = db_manager.redis_client.get(cache_key)
+    except RedisError:
+        cached_data = None
+    
+    if cached_data:
+        data = orjson.loads(cached_data)
+    else:
+        data = make_api_request(url, params)
+        try:
+            db_manager.redis_client.setex(cache_key, int(cache.ttl), orjson.dumps(data))
+        except RedisError:
+            pass
+    
+    with _cache_lock:
+        cache[cache_key] = data
+    return data
+
 def get_current_weather_and_forecast(lat: float, lon: float, api_key: str, 
                                    exclude: Optional[List[str]] = None, 
                                    units: str = "metric") -> Dict:
@@ -110,7 +177,7 @@ def get_current_weather_and_forecast(lat: float, lon: float, api_key: str,
     if exclude:
         params["exclude"] = ",".join(exclude)
     
-    return make_api_request(BASE_URL, params)
+    return _cached_api_request(BASE_URL, params, _forecast_cache)
 
 def get_historical_weather(lat: float, lon: float, api_key: str, 
                           timestamp: int, units: str = "metric") -> Dict:
@@ -136,7 +203,7 @@ def get_historical_weather(lat: float, lon: float, api_key: str,
         "units": units
     }
     
-    return make_api_request(url, params)
+    return _cached_api_request(url, params, _historical_cache)
 
 def get_daily_aggregation(lat: float, lon: float, api_key: str, 
                          date: str, units: str = "metric") -> Dict:
@@ -162,7 +229,7 @@ def get_daily_aggregation(lat: float, lon: float, api_key: str,
         "units": units
     }
     
-    return make_api_request(url, params)
+    return _cached_api_request(url, params, _historical_cache)
 
 def get_weather_overview(lat: float, lon: float, api_key: str, 
                         units: str = "metric") -> Dict:
@@ -186,10 +253,36 @@ def get_weather_overview(lat: float, lon: float, api_key: str,
         "units": units
     }
     
-    return make_api_request(url, params)
+    return _cached_api_request(url, params, _forecast_cache)
 
 # Helper functions for farmers
 
+def _weather_desc(weather: Optional[List[Dict]]) -> Optional[str]:
+    """Description of the first entry of an OpenWeather "weather" list, if any"""
+    return weather[0].get("description") if weather else None
+
+def _daily_forecast_entry(day: Dict) -> Dict:
+    """Extract the farmer-relevant fields from one day of the OpenWeather daily forecast"""
+    temp = day.get("temp") or {}
+    daily_info = {
+        # time.strftime on a struct_time avoids building a datetime per day
+        "date": time.strftime("%Y-%m-%d", time.localtime(day.get("dt", 0))),
+        "temp_max": temp.get("max"),
+        "temp_min": temp.get("min"),
+        "humidity": day.get("humidity"),
+        "wind_speed": day.get("wind_speed"),
+        "weather": _weather_desc(day.get("weather")),
+        "precipitation_probability": day.get("pop", 0) * 100,  # Convert to percentage
+        "uv_index": day.get("uvi"),
+        "sunrise": day.get("sunrise"),
+        "sunset": day.get("sunset")
+    }
+    
+    # Add rainfall data if available
+    if "rain" in day:
+        daily_info["rainfall"] = day["rain"]
+    return daily_info
+
 def extract_farmer_relevant_data(weather_data: Dict) -> Dict:
     """Extract weather information most relevant to farmers"""
     try:
@@ -204,36 +297,16 @@ def extract_farmer_relevant_data(weather_data: Dict) -> Dict:
                 "pressure": current.get("pressure"),
                 "wind_speed": current.get("wind_speed"),
                 "wind_direction": current.get("wind_deg"),
-                "weather_description": current.get("weather", [{}])[0].get("description"),
+                "weather_description": _weather_desc(current.get("weather")),
                 "visibility": current.get("visibility"),
                 "uv_index": current.get("uvi"),
                 "sunrise": current.get("sunrise"),
                 "sunset": current.get("sunset")
             },
-            "daily_forecast": []
+            # Next 7 days forecast
+            "daily_forecast": [_daily_forecast_entry(day) for day in daily[:7]]
         }
         
-        # Extract next 7 days forecast
-        for day in daily[:7]:
-            daily_info = {
-                "date": datetime.fromtimestamp(day.get("dt", 0)).strftime("%Y-%m-%d"),
-                "temp_max": day.get("temp", {}).get("max"),
-                "temp_min": day.get("temp", {}).get("min"),
-                "humidity": day.get("humidity"),
-                "wind_speed": day.get("wind_speed"),
-                "weather": day.get("weather", [{}])[0].get("description"),
-                "precipitation_probability": day.get("pop", 0) * 100,  # Convert to percentage
-                "uv_index": day.get("uvi"),
-                "sunrise": day.get("sunrise"),
-                "sunset": day.get("sunset")
-            }
-            
-            # Add rainfall data if available
-            if "rain" in day:
-                daily_info["rainfall"] = day["rain"]
-            
-            farmer_data["daily_forecast"].append(daily_info)
-        
         return farmer_data
     
     except Exception as e:
@@ -247,67 +320,66 @@ def format_weather_for_sms(weather_data: Dict, location_name: str = "") -> str:
         forecast = weather_data.get("daily_forecast", [])
         
         # Current weather (keep it concise for SMS)
-        sms_text = f"Weather {location_name}\n"
-        sms_text += f"Now: {current.get('temperature', 'N/A')}°C, {current.get('weather_description', 'N/A')}\n"
-        sms_text += f"Humidity: {current.get('humidity', 'N/A')}%, Wind: {current.get('wind_speed', 'N/A')}m/s\n"
+        lines = [
+            f"Weather {location_name}",
+            f"Now: {current.get('temperature', 'N/A')}°C, {current.get('weather_description', 'N/A')}",
+            f"Humidity: {current.get('humidity', 'N/A')}%, Wind: {current.get('wind_speed', 'N/A')}m/s",
+            "3-Day Forecast:"
+        ]
         
         # Next 3 days forecast (most relevant for farmers)
-        sms_text += "3-Day Forecast:\n"
-        for day in forecast[:3]:
-            date = day.get('date', 'N/A')
-            temp_max = day.get('temp_max', 'N/A')
-            temp_min = day.get('temp_min', 'N/A')
-            rain_prob = day.get('precipitation_probability', 0)
-            weather = day.get('weather', 'N/A')
-            
-            sms_text += f"{date}: {temp_min}-{temp_max}°C, Rain:{rain_prob:.0f}%, {weather}\n"
+        lines.extend(
+            f"{day.get('date', 'N/A')}: {day.get('temp_min', 'N/A')}-{day.get('temp_max', 'N/A')}°C, "
+            f"Rain:{day.get('precipitation_probability', 0):.0f}%, {day.get('weather', 'N/A')}"
+            for day in forecast[:3]
+        )
         
-        return sms_text.strip()
+        return "\n".join(lines).strip()
     
     except Exception as e:
         # logger.error(f"Error formatting SMS: {e}")
         return "Weather data unavailable"
 
+# Alert rules on current conditions: (field, comparison, threshold, message), checked in order
+CURRENT_ALERT_RULES = (
+    ("temperature", operator.gt, 35, "High temperature alert: Consider irrigation and shade for crops"),
+    ("temperature", operator.lt, 5, "Low temperature alert: Protect sensitive crops from frost"),
+    ("humidity", operator.gt, 90, "High humidity: Monitor for fungal diseases"),
+    ("humidity", operator.lt, 30, "Low humidity: Increase irrigation frequency"),
+    ("wind_speed", operator.gt, 10, "Strong winds: Secure greenhouse structures and young plants"),
+    ("uv_index", operator.gt, 8, "High UV: Provide shade for workers and sensitive crops"),
+)
+# Rain alerts for each of the next ALERT_FORECAST_DAYS days, keyed on precipitation probability (%)
+ALERT_FORECAST_DAYS = 3
+HEAVY_RAIN_PROBABILITY = 80
+NO_RAIN_PROBABILITY = 10
+HEAVY_RAIN_ALERT = "Heavy rain expected {date}: Prepare drainage and harvest ready crops"
+NO_RAIN_ALERT = "No rain expected {date}: Plan irrigation"
+
+def _rain_alert(rain_prob: float, date: str) -> Optional[str]:
+    """Rain alert for one forecast day, if any"""
+    if rain_prob > HEAVY_RAIN_PROBABILITY:
+        return HEAVY_RAIN_ALERT.format(date=date)
+    if rain_prob < NO_RAIN_PROBABILITY:
+        return NO_RAIN_ALERT.format(date=date)
+    return None
+
 def get_farming_alerts(weather_data: Dict) -> List[str]:
     """Generate farming-specific alerts based on weather conditions"""
-    alerts = []
-    
     try:
         current = weather_data.get("current_conditions", {})
         forecast = weather_data.get("daily_forecast", [])
         
-        # Temperature alerts
-        temp = current.get("temperature")
-        if temp and temp > 35:
-            alerts.append("High temperature alert: Consider irrigation and shade for crops")
-        elif temp and temp < 5:
-            alerts.append("Low temperature alert: Protect sensitive crops from frost")
+        alerts = []
+        for field, compare, threshold, message in CURRENT_ALERT_RULES:
+            value = current.get(field)
+            if value is not None and compare(value, threshold):
+                alerts.append(message)
         
-        # Humidity alerts
-        humidity = current.get("humidity")
-        if humidity and humidity > 90:
-            alerts.append("High humidity: Monitor for fungal diseases")
-        elif humidity and humidity < 30:
-            alerts.append("Low humidity: Increase irrigation frequency")
-        
-        # Wind alerts
-        wind_speed = current.get("wind_speed")
-        if wind_speed and wind_speed > 10:
-            alerts.append("Strong winds: Secure greenhouse structures and young plants")
-        
-        # UV alerts
-        uv_index = current.get("uv_index")
-        if uv_index and uv_index > 8:
-            alerts.append("High UV: Provide shade for workers and sensitive crops")
-        
-        # Rain forecast alerts
-        for day in forecast[:3]:
-            rain_prob = day.get("precipitation_probability", 0)
-            date = day.get("date", "")
-            if rain_prob > 80:
-                alerts.append(f"Heavy rain expected {date}: Prepare drainage and harvest ready crops")
-            elif rain_prob < 10:
-                alerts.append(f"No rain expected {date}: Plan irrigation")
+        for day in forecast[:ALERT_FORECAST_DAYS]:
+            alert = _rain_alert(day.get("precipitation_probability", 0), day.get("date", ""))
+            if alert:
+                alerts.append(alert)
         
         return alerts
     
@@ -315,41 +387,63 @@ def get_farming_alerts(weather_data: Dict) -> List[str]:
         # logger.error(f"Error generating farming alerts: {e}")
         return []
 
-
-@lru_cache(maxsize=1)
-def get_kenya_wards_data(file_path):
+def get_farming_alerts_batch(weather_data_list: List[Dict]) -> List[List[str]]:
     """
-    Reads a JSON file containing data on Kenyan wards from the given file path and returns the parsed data as a Python object.
-
-    Parameters:
-        file_path (str): The path to the JSON file.
-
+    get_farming_alerts for many forecasts at once (e.g. a multi-ward digest)
+    
+    The current-condition and rain thresholds are compared with NumPy across all records;
+    only assembling the per-record message lists is done in Python.
+    
+    Args:
+        weather_data_list: Processed weather data dictionaries (as passed to get_farming_alerts)
+    
     Returns:
-        dict : The parsed JSON content.
-
-    Raises:
-        FileNotFoundError: If the file does not exist.
-        json.JSONDecodeError: If the file is not valid JSON.
+        Alerts for each record, in the same order and form as get_farming_alerts
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        return data
-    except FileNotFoundError:
-        print(f"❌ File not found: {file_path}")
-        raise
-    except json.JSONDecodeError as e:
-        print(f"❌ Failed to decode JSON: {e}")
-        raise
+    currents = [data.get("current_conditions", {}) for data in weather_data_list]
+    forecasts = [data.get("daily_forecast", [])[:ALERT_FORECAST_DAYS] for data in weather_data_list]
+    
+    # Missing values become NaN, which compares False against every threshold
+    def column(field):
+        return np.array([np.nan if c.get(field) is None else c[field] for c in currents], dtype=float)
+    
+    columns = {field: column(field) for field in {rule[0] for rule in CURRENT_ALERT_RULES}}
+    rule_masks = [
+        (compare(columns[field], threshold), message)
+        for field, compare, threshold, message in CURRENT_ALERT_RULES
+    ]
+    
+    # Rain probabilities as a (records x days) array, padded with NaN for missing days
+    rain = np.full((len(forecasts), ALERT_FORECAST_DAYS), np.nan)
+    for i, forecast in enumerate(forecasts):
+        rain[i, :len(forecast)] = [day.get("precipitation_probability", 0) for day in forecast]
+    heavy_rain = rain > HEAVY_RAIN_PROBABILITY
+    no_rain = rain < NO_RAIN_PROBABILITY
+    
+    results = []
+    for i, forecast in enumerate(forecasts):
+        alerts = [message for mask, message in rule_masks if mask[i]]
+        for d, day in enumerate(forecast):
+            if heavy_rain[i, d]:
+                alerts.append(HEAVY_RAIN_ALERT.format(date=day.get("date", "")))
+            elif no_rain[i, d]:
+                alerts.append(NO_RAIN_ALERT.format(date=day.get("date", "")))
+        results.append(alerts)
+    return results
 
 
 def get_coordinates_by_region(county: str, subcounty: str, ward: str) -> Optional[Tuple[float, float]]:
-    """Get coordinates for a Kenya region"""
-    path = Path(os.getenv("KENYA_WARDS_FILE", "../assets/kenya_wards.json")).resolve()
-    regions = get_kenya_wards_data(path)
-    ward = regions.get(county, {}).get(subcounty, {}).get(ward, {})
-    ward_coordinates = ward.get("centroid", [])
-    return ward_coordinates
+    """Get (latitude, longitude) for a Kenya region from the shared, pre-indexed ward data"""
+    try:
+        ward_data = get_ward_data(county, subcounty, ward)
+    except ValueError:
+        return None
+    centroid = ward_data.get("centroid")
+    if not centroid:
+        return None
+    # Centroids are stored GeoJSON-style as [lon, lat]
+    lon, lat = centroid
+    return lat, lon
 
 
 # Main weather tool functions for the ReAct agent
@@ -383,7 +477,7 @@ def get_weather_for_farmer(county: str,
         
         # Get weather data based on type
         if weather_type == "current_and_forecast":
-            raw_data = get_current_weather_and_forecast(lat, lon, API_KEY)
+            raw_data = get_current_weather_and_forecast(lat, lon, API_KEY, exclude=FARMER_FORECAST_EXCLUDE)
             processed_data = extract_farmer_relevant_data(raw_data)
             
         elif weather_type == "overview":
@@ -391,8 +485,9 @@ def get_weather_for_farmer(county: str,
             processed_data = {"overview": raw_data}
             
         elif weather_type == "historical":
-            # Get yesterday's data as example
-            yesterday = int((datetime.now() - timedelta(days=1)).timestamp())
+            # Get yesterday's data as example, truncated to the hour so repeat lookups share a cache key
+            yesterday = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+            yesterday = int(yesterday.timestamp())
             raw_data = get_historical_weather(lat, lon, API_KEY, yesterday)
             processed_data = {"historical": raw_data}
             
@@ -419,13 +514,14 @@ def get_weather_for_farmer(county: str,
         }
     
     except requests.exceptions.HTTPError as e:
-        if "429" in str(e):
+        status_code = getattr(e.response, "status_code", None)
+        if status_code == 429:
             return {
                 "success": False,
                 "error": "daily_limit_exceeded",
                 "message": "Daily API limit reached. Please try again tomorrow or upgrade your plan."
             }
-        elif "401" in str(e):
+        elif status_code == 401:
             return {
                 "success": False,
                 "error": "invalid_api_key",
@@ -446,6 +542,29 @@ def get_weather_for_farmer(county: str,
             "message": f"Error getting weather data: {str(e)}"
         }
 
+def get_weather_for_farmers(locations: List[Tuple[str, str, str]],
+                            weather_type: str = "current_and_forecast") -> List[Dict]:
+    """
+    Get weather data for several wards at once
+    
+    Wards are fetched concurrently over the shared session; in-flight API calls are capped by a semaphore.
+    
+    Args:
+        locations: List of (county, subcounty, ward) tuples
+        weather_type: Passed through to get_weather_for_farmer
+    
+    Returns:
+        List of results from get_weather_for_farmer, in the same order as locations
+    """
+    if not locations:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(WEATHER_BATCH_WORKERS, len(locations))) as executor:
+        return list(executor.map(
+            lambda location: get_weather_for_farmer(*location, weather_type=weather_type),
+            locations
+        ))
+
 # Example usage and testing functions
 
 def test_weather_tool():
@@ -456,7 +575,7 @@ def test_weather_tool():
     
     if result["success"]:
         print("Weather data retrieved successfully!")
-        print(json.dumps(result["data"], indent=2))
+        print(orjson.dumps(result["data"], option=orjson.OPT_INDENT_2).decode())
         
         # Print SMS format
         if "sms_format" in result["data"]: